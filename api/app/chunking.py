@@ -1,8 +1,13 @@
 """
 Text chunking utilities for RAG-ready document processing.
 """
+import codecs
 from typing import List
 
+# Longest "word" StreamingChunker keeps whole; longer runs without whitespace
+# (base64, minified data) are cut into pieces of this many characters
+MAX_WORD_CHARS = 4096
+
 
 def chunk_text(
     text: str, 
@@ -63,3 +68,155 @@ def chunk_text(
             break
     
     return chunks
+
+
+def merge_overlapping_chunks(chunks: List[str], max_overlap: int = 50) -> str:
+    """
+    Join consecutive chunks of one document back into a single passage,
+    removing the words duplicated by chunk overlap.
+    
+    For each pair of neighbouring chunks the longest suffix of the passage
+    (up to max_overlap words) that equals a prefix of the next chunk is
+    dropped from that chunk before joining.
+    
+    Args:
+        chunks: Consecutive chunks ordered by chunk_index
+        max_overlap: Upper bound of overlapping words to look for
+    
+    Returns:
+        De-duplicated passage text
+    
+    Example:
+        >>> merge_overlapping_chunks(["a b c d", "c d e f"], max_overlap=2)
+        'a b c d e f'
+    """
+    words: List[str] = []
+    
+    for chunk in chunks:
+        chunk_words = chunk.split()
+        
+        # Find the longest overlap between the passage tail and the chunk head
+        shared = 0
+        for size in range(min(max_overlap, len(words), len(chunk_words)), 0, -1):
+            if words[-size:] == chunk_words[:size]:
+                shared = size
+                break
+        
+        words.extend(chunk_words[shared:])
+    
+    return " ".join(words)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough LLM token estimate for a piece of text.
+    
+    Uses ~4/3 tokens per whitespace-separated word, which is close enough
+    for budgeting prompts without loading a tokenizer.
+    """
+    return (len(text.split()) * 4 + 2) // 3
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut text down to the number of words that fits into max_tokens.
+    """
+    max_words = (max_tokens * 3) // 4
+    words = text.split()
+    if len(words) <= max_words:
+        return text
+    return " ".join(words[:max_words])
+
+
+class StreamingChunker:
+    """
+    Incremental version of chunk_text() for text that arrives in pieces.
+    
+    Holds at most chunk_size words (plus one partial word) in memory and
+    returns chunks as soon as they are complete, in time linear in the size
+    of each piece. For the same text it yields the same chunks as
+    chunk_text(), except that a single-chunk document is whitespace-normalized
+    instead of returned verbatim, and words longer than MAX_WORD_CHARS are
+    cut into several words.
+    
+    Example:
+        >>> chunker = StreamingChunker(chunk_size=300, overlap=50)
+        >>> for piece in pieces:
+        ...     for chunk in chunker.feed(piece):
+        ...         store(chunk)
+        >>> for chunk in chunker.finish():
+        ...     store(chunk)
+    """
+    
+    def __init__(self, chunk_size: int = 300, overlap: int = 50):
+        if not 0 <= overlap < chunk_size:
+            raise ValueError("overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.words: List[str] = []
+        self.partial = ""
+        self.emitted = 0
+        # UTF-8 sequences may be split across byte pieces
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    
+    def feed(self, text: str) -> List[str]:
+        """
+        Add a piece of text, return the chunks completed by it.
+        """
+        text = self.partial + text
+        words = text.split()
+        
+        # A piece that does not end in whitespace may end mid-word
+        if words and not text[-1].isspace():
+            self.partial = words.pop()
+        else:
+            self.partial = ""
+        
+        # Cut at multiples of MAX_WORD_CHARS from the start of the word, so
+        # the result does not depend on where the pieces were split
+        if len(self.partial) > MAX_WORD_CHARS:
+            cut = len(self.partial) - len(self.partial) % MAX_WORD_CHARS
+            words.append(self.partial[:cut])
+            self.partial = self.partial[cut:]
+        
+        for word in words:
+            if len(word) > MAX_WORD_CHARS:
+                self.words.extend(word[i:i + MAX_WORD_CHARS] for i in range(0, len(word), MAX_WORD_CHARS))
+            else:
+                self.words.append(word)
+        return self._drain()
+    
+    def feed_bytes(self, data: bytes) -> List[str]:
+        """
+        Like feed() for UTF-8 bytes; invalid sequences become U+FFFD.
+        """
+        return self.feed(self._decoder.decode(data))
+    
+    def finish(self) -> List[str]:
+        """
+        Flush the remaining words at the end of the text.
+        """
+        chunks = self.feed(self._decoder.decode(b"", final=True))
+        if self.partial:
+            self.words.append(self.partial)
+            self.partial = ""
+        
+        chunks.extend(self._drain())
+        
+        # Last (shorter) chunk, unless its words are all in the previous chunk's overlap
+        if self.words and (self.emitted == 0 or len(self.words) > self.overlap):
+            chunks.append(" ".join(self.words))
+            self.emitted += 1
+        self.words = []
+        return chunks
+    
+    def _drain(self) -> List[str]:
+        chunks = []
+        start = 0
+        while len(self.words) - start >= self.chunk_size:
+            chunks.append(" ".join(self.words[start:start + self.chunk_size]))
+            self.emitted += 1
+            # Keep the overlap for the next chunk
+            start += self.chunk_size - self.overlap
+        del self.words[:start]
+        return chunks
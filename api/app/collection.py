@@ -0,0 +1,239 @@
+"""
+Named collections: separate logical corpora (player news, match reports,
+test data, ...) stored in their own LIST partition of the chunks table,
+each with its own distance metric and vector index.
+"""
+import os
+import re
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from psycopg import sql
+
+import logging
+from app.db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/collections", tags=["collections"])
+
+DEFAULT_COLLECTION = "default"
+
+# Collection names end up in partition names, keep them identifier-safe
+COLLECTION_NAME_RE = re.compile(r"^[a-z0-9_]{1,48}$")
+
+# pgvector operator and index opclass for every supported metric.
+# "ip" is the negative inner product (<#>), so lower is still better;
+# it is only meaningful for normalized embeddings.
+METRICS = {
+    "l2": ("<->", "vector_l2_ops"),
+    "cosine": ("<=>", "vector_cosine_ops"),
+    "ip": ("<#>", "vector_ip_ops"),
+}
+
+# HNSW candidate list size (hnsw.ef_search) used for searches: higher = better
+# recall, slower queries. A scan never returns more rows than ef_search, so
+# it is raised to the requested limit when that is larger.
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+
+# pgvector's upper bound for hnsw.ef_search, and so for search limits
+MAX_SEARCH_LIMIT = 1000
+
+# Metric never changes after a collection is created, so it is safe to cache
+_metric_cache: dict[str, str] = {}
+
+
+class CollectionCreate(BaseModel):
+    name: str = Field(..., description="Collection name (a-z, 0-9, _)")
+    metric: Literal["l2", "cosine", "ip"] = Field("l2", description="Distance metric used for search")
+
+
+class CollectionResponse(BaseModel):
+    name: str
+    metric: str
+    partition: str
+    created_at: datetime
+
+
+def partition_name(name: str) -> str:
+    """
+    Name of the chunks partition that stores a collection.
+    """
+    return f"chunks_{name}"
+
+
+def create_embedding_index(cursor, name: str, metric: str, column: str, concurrently: bool = False):
+    """
+    Create the HNSW index of one embedding column on a collection's partition.
+
+    HNSW (unlike IVFFlat) needs no training data, so the index can be
+    created on an empty partition.
+
+    concurrently=True builds without blocking writes (CREATE INDEX
+    CONCURRENTLY); it must run outside a transaction block.
+    """
+    partition = partition_name(name)
+    index = f"{partition}_{column}_idx"[:63]
+
+    if concurrently:
+        # An interrupted concurrent build leaves an INVALID index behind,
+        # which IF NOT EXISTS would keep; drop it and start over
+        cursor.execute(
+            """
+            SELECT i.indisvalid
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s;
+            """,
+            (index,)
+        )
+        row = cursor.fetchone()
+        if row and not row[0]:
+            logger.warning("Dropping invalid index %s left by an interrupted build", index)
+            cursor.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {};").format(sql.Identifier(index)))
+
+    cursor.execute(
+        sql.SQL("CREATE INDEX {} IF NOT EXISTS {} ON {} USING hnsw ({} {});").format(
+            sql.SQL("CONCURRENTLY") if concurrently else sql.SQL(""),
+            sql.Identifier(index),
+            sql.Identifier(partition),
+            sql.Identifier(column),
+            sql.SQL(METRICS[metric][1])
+        )
+    )
+
+
+def create_collection_partition(cursor, name: str, metric: str):
+    """
+    Create the chunks partition for a collection and vector indexes for
+    every embedding column in use (active or being built).
+    """
+    cursor.execute(
+        sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF chunks FOR VALUES IN ({});").format(
+            sql.Identifier(partition_name(name)), sql.Literal(name)
+        )
+    )
+
+    cursor.execute("SELECT column_name FROM embedding_models WHERE status IN ('active', 'building');")
+    for (column,) in cursor.fetchall():
+        create_embedding_index(cursor, name, metric, column)
+
+
+def get_collection_metric(cursor, name: str) -> str:
+    """
+    Return the metric of a collection or raise 404 if it does not exist.
+    """
+    if name in _metric_cache:
+        return _metric_cache[name]
+
+    cursor.execute("SELECT metric FROM collections WHERE name = %s;", (name,))
+    row = cursor.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail=f"Collection '{name}' not found")
+
+    _metric_cache[name] = row[0]
+    return row[0]
+
+
+def uses_normalized_embeddings(metric: str) -> bool:
+    """
+    Inner product (and cosine) collections store unit-length embeddings.
+    """
+    return metric in ("ip", "cosine")
+
+
+def set_search_ef(cursor, limit: int):
+    """
+    Size the HNSW candidate list for a top-`limit` query.
+
+    Transaction-local (SET LOCAL), so call it inside conn.transaction()
+    together with the search query.
+    """
+    ef_search = min(max(HNSW_EF_SEARCH, limit), MAX_SEARCH_LIMIT)
+    cursor.execute("SELECT set_config('hnsw.ef_search', %s, true);", (str(ef_search),))
+
+
+def distance_operator(metric: str) -> sql.SQL:
+    """
+    pgvector distance operator for a metric, ready for sql.SQL.format().
+    """
+    return sql.SQL(METRICS[metric][0])
+
+
+@router.post("", response_model=CollectionResponse)
+async def create_collection(collection: CollectionCreate):
+    """
+    Create a named collection with its own chunks partition and vector index.
+    """
+    if not COLLECTION_NAME_RE.match(collection.name):
+        raise HTTPException(status_code=400, detail="Collection name must match [a-z0-9_]{1,48}")
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        with conn.transaction():
+            cursor.execute(
+                """
+                INSERT INTO collections (name, metric)
+                VALUES (%s, %s)
+                ON CONFLICT (name) DO NOTHING
+                RETURNING name, metric, created_at;
+                """,
+                (collection.name, collection.metric)
+            )
+            row = cursor.fetchone()
+            if row:
+                create_collection_partition(cursor, collection.name, collection.metric)
+
+        cursor.close()
+        conn.close()
+
+        if not row:
+            raise HTTPException(status_code=409, detail=f"Collection '{collection.name}' already exists")
+
+        logger.info("Collection created: '%s' (metric: %s)", collection.name, collection.metric)
+        return CollectionResponse(
+            name=row[0],
+            metric=row[1],
+            partition=partition_name(row[0]),
+            created_at=row[2]
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error creating collection: %s", e, extra={"event": "collection_create_error"})
+        raise HTTPException(status_code=500, detail=f"Failed to create collection: {str(e)}")
+
+
+@router.get("", response_model=list[CollectionResponse])
+async def list_collections():
+    """
+    List all collections.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT name, metric, created_at FROM collections ORDER BY name;")
+        rows = cursor.fetchall()
+
+        cursor.close()
+        conn.close()
+
+        return [
+            CollectionResponse(
+                name=row[0],
+                metric=row[1],
+                partition=partition_name(row[0]),
+                created_at=row[2]
+            )
+            for row in rows
+        ]
+
+    except Exception as e:
+        logger.error("Error listing collections: %s", e, extra={"event": "collection_list_error"})
+        raise HTTPException(status_code=500, detail=f"Failed to list collections: {str(e)}")
@@ -0,0 +1,77 @@
+"""
+Context-window assembly for RAG.
+
+Groups search hits by document, merges overlapping / adjacent chunks into
+de-duplicated passages and fits them into a token budget.
+"""
+from typing import Any
+
+from app.chunking import merge_overlapping_chunks, estimate_tokens, truncate_to_tokens
+
+
+def build_passages(
+    rows: list[tuple],
+    max_overlap: int,
+    max_tokens: int
+) -> tuple[list[dict[str, Any]], int, bool]:
+    """
+    Build de-duplicated passages from chunk rows.
+
+    Args:
+        rows: Tuples of (document_id, chunk_index, title, body, metadata,
+              distance, is_hit); neighbour rows carry the distance of the
+              hit they were expanded from
+        max_overlap: Maximum number of overlapping words between chunks
+        max_tokens: Total token budget for all passages
+
+    Returns:
+        (passages ordered by best distance, total tokens, truncated flag)
+    """
+    # Split each document into runs of consecutive chunk indexes
+    runs: list[list[tuple]] = []
+    for row in sorted(rows, key=lambda r: (r[0], r[1])):
+        last = runs[-1][-1] if runs else None
+        if last is not None and last[0] == row[0] and row[1] <= last[1] + 1:
+            if row[1] == last[1]:
+                # Same chunk twice: keep it once, as a hit if either copy is one
+                runs[-1][-1] = last[:5] + (min(last[5], row[5]), last[6] or row[6])
+                continue
+            runs[-1].append(row)
+        else:
+            runs.append([row])
+
+    passages = []
+    for run in runs:
+        hits = [r for r in run if r[6]]
+        passages.append({
+            "document_id": run[0][0],
+            "title": run[0][2],
+            "metadata": run[0][4],
+            "chunk_start": run[0][1],
+            "chunk_end": run[-1][1],
+            "hit_chunk_indexes": [r[1] for r in hits],
+            "body": merge_overlapping_chunks([r[3] for r in run], max_overlap=max_overlap),
+            "distance": min(r[5] for r in (hits or run)),
+        })
+    passages.sort(key=lambda p: p["distance"])
+
+    # Enforce the token budget, best passages first
+    selected = []
+    total_tokens = 0
+    truncated = False
+    for passage in passages:
+        remaining = max_tokens - total_tokens
+        tokens = estimate_tokens(passage["body"])
+        if tokens > remaining:
+            truncated = True
+            passage["body"] = truncate_to_tokens(passage["body"], remaining)
+            tokens = estimate_tokens(passage["body"])
+            if tokens == 0:
+                break
+        passage["tokens"] = tokens
+        selected.append(passage)
+        total_tokens += tokens
+        if truncated:
+            break
+
+    return selected, total_tokens, truncated
@@ -1,12 +1,20 @@
 """
-Database connection helper for PostgreSQL with pgvector.
+Database connection helper for PostgreSQL with pgvector, plus the
+versioned migration runner used at startup.
 """
 import os
+import re
+from pathlib import Path
+from typing import Optional
+
 import psycopg
-from psycopg import sql
 
+import logging
+
+logger = logging.getLogger(__name__)
 
-def get_db_connection():
+
+def get_db_connection(connect_timeout: Optional[int] = None):
     """
     Create and return a database connection using environment variables.
     """
@@ -18,139 +26,133 @@ def get_db_connection():
     
     connection_string = f"host={db_host} port={db_port} dbname={db_name} user={db_user} password={db_password}"
     
+    if connect_timeout is not None:
+        connection_string += f" connect_timeout={connect_timeout}"
+    
     conn = psycopg.connect(connection_string, autocommit=True)
     return conn
 
 
-def init_database():
+# SQL migrations, applied in order of their numeric prefix (NNN_description.sql)
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+MIGRATION_FILE_RE = re.compile(r"^(\d+)_(.+)\.sql$")
+
+# Advisory lock key so only one replica migrates at a time
+MIGRATIONS_LOCK_ID = 4032
+
+
+def discover_migrations() -> list[tuple[int, str, Path]]:
+    """
+    Return (version, name, path) of every migration file, ordered by version.
+    """
+    migrations = []
+    for path in MIGRATIONS_DIR.glob("*.sql"):
+        match = MIGRATION_FILE_RE.match(path.name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), path))
+    return sorted(migrations)
+
+
+def get_applied_versions(cursor) -> set[int]:
+    """
+    Versions recorded in schema_migrations (empty if the table does not exist yet).
+    """
+    cursor.execute("SELECT to_regclass('schema_migrations');")
+    if cursor.fetchone()[0] is None:
+        return set()
+    cursor.execute("SELECT version FROM schema_migrations;")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def detect_legacy_versions(cursor) -> set[int]:
+    """
+    Databases created before schema_migrations existed were set up by the old
+    init_database(); work out which migrations their schema already contains.
     """
-    Initialize the database: create pgvector extension, create tables, and create indexes.
-    This runs once when the FastAPI app starts.
+    cursor.execute("SELECT to_regclass('documents'), to_regclass('embedding_models');")
+    documents, embedding_models = cursor.fetchone()
+    if documents is None:
+        return set()
+
+    # documents, chunks and players were always created together
+    versions = {0, 1, 2}
+
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'chunks' AND relkind IN ('r', 'p');")
+    row = cursor.fetchone()
+    if row and row[0] == "p":
+        versions.add(3)
+    if embedding_models is not None:
+        versions.add(4)
+    return versions
+
+
+def init_database() -> list[int]:
+    """
+    Bring the schema up to date by applying pending migrations from api/migrations.
     
-    NOTE: This version uses vector(384) for sentence-transformers/all-MiniLM-L6-v2
-    Creates both 'documents' table (for metadata) and 'chunks' table (for RAG retrieval)
+    When nothing is pending this is one cheap SELECT: no DDL runs and no
+    table locks are taken, so restarts stay fast. Each migration runs in its
+    own transaction together with its schema_migrations row.
+    Returns the versions applied by this call.
     """
+    migrations = discover_migrations()
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        # Enable pgvector extension
-        print("Creating pgvector extension...")
-        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector;")
-        
-        # Create documents table with vector(384) for sentence-transformers
-        # Using IF NOT EXISTS to preserve data on restart
-        print("Creating documents table if not exists (vector(384))...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id SERIAL PRIMARY KEY,
-                title TEXT NOT NULL,
-                body TEXT NOT NULL,
-                metadata JSONB,
-                embedding vector(384)
-            );
-        """)
-        
-        # Create chunks table for RAG-ready chunking
-        print("Creating chunks table if not exists...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS chunks (
-                id SERIAL PRIMARY KEY,
-                document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
-                chunk_index INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                body TEXT NOT NULL,
-                metadata JSONB,
-                embedding vector(384),
-                UNIQUE(document_id, chunk_index)
-            );
-        """)
-        
-        # NOTE: IVFFlat index disabled for small datasets (< 100 documents/chunks)
-        # IVFFlat requires significant data to work properly (~100+ documents)
-        # For small datasets, brute-force search is more reliable
-        # Uncomment below to enable IVFFlat for production with large datasets:
-        #
-        # print("Creating vector index if not exists...")
-        # cursor.execute("""
-        #     CREATE INDEX IF NOT EXISTS documents_embedding_idx
-        #     ON documents
-        #     USING ivfflat (embedding vector_l2_ops)
-        #     WITH (lists = 100);
-        # """)
-        # cursor.execute("""
-        #     CREATE INDEX IF NOT EXISTS chunks_embedding_idx
-        #     ON chunks
-        #     USING ivfflat (embedding vector_l2_ops)
-        #     WITH (lists = 100);
-        # """)
-        
-        # Create GIN index on JSONB metadata for fast JSON queries
-        print("Creating JSONB indexes if not exist...")
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS documents_metadata_idx
-            ON documents
-            USING gin (metadata);
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS chunks_metadata_idx
-            ON chunks
-            USING gin (metadata);
-        """)
-        
-        # Create index on chunks.document_id for fast lookups
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS chunks_document_id_idx
-            ON chunks(document_id);
-        """)
-        
-        # Create players table for Player Profile Generator
-        print("Creating players table if not exists...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS players (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                summary TEXT NOT NULL,
-                metadata JSONB DEFAULT '{}',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(name)
-            );
-        """)
-        
-        # Create indexes for players table
-        print("Creating players indexes if not exist...")
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_players_name ON players(name);
-        """)
-
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_players_metadata ON players USING gin(metadata);
-        """)
-        
-        # Create trigger for auto-updating updated_at
-        cursor.execute("""
-            CREATE OR REPLACE FUNCTION update_updated_at_column()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                NEW.updated_at = CURRENT_TIMESTAMP;
-                RETURN NEW;
-            END;
-            $$ language 'plpgsql';
-        """)
-        cursor.execute("""
-            DROP TRIGGER IF EXISTS update_players_updated_at ON players;
-        """)
-        cursor.execute("""
-            CREATE TRIGGER update_players_updated_at BEFORE UPDATE ON players
-                FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
-        """)
-        
-        print("Database initialization complete! Using vector(384) for sentence-transformers.")
-        print("Tables created: documents, chunks, players")
+        if not [m for m in migrations if m[0] not in get_applied_versions(cursor)]:
+            logger.info("Database schema is up to date")
+            return []
         
+        # Another replica may be migrating right now; wait for it and re-check
+        cursor.execute("SELECT pg_advisory_lock(%s);", (MIGRATIONS_LOCK_ID,))
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            
+            applied = get_applied_versions(cursor)
+            if not applied:
+                baseline = detect_legacy_versions(cursor)
+                for version, name, _ in migrations:
+                    if version in baseline:
+                        cursor.execute(
+                            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s);",
+                            (version, name)
+                        )
+                if baseline:
+                    logger.info("Existing schema baselined at versions %s", sorted(baseline))
+                applied = baseline
+            
+            applied_now = []
+            for version, name, path in migrations:
+                if version in applied:
+                    continue
+                logger.info("Applying migration %s...", path.name)
+                with conn.transaction():
+                    cursor.execute(path.read_text())
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s);",
+                        (version, name)
+                    )
+                applied_now.append(version)
+            
+            logger.info("Database migrations applied: %s", applied_now)
+            return applied_now
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s);", (MIGRATIONS_LOCK_ID,))
+    
     except Exception as e:
-        print(f"Error during database initialization: {e}")
+        # Migrations explain how to fix data they refuse to touch in the HINT
+        hint = getattr(getattr(e, "diag", None), "message_hint", None)
+        logger.error(
+            "Error during database migration: %s%s", e, f" (hint: {hint})" if hint else "",
+            extra={"event": "migration_error"}
+        )
         raise
     finally:
         cursor.close()
@@ -0,0 +1,129 @@
+"""
+Embedding models: loading sentence-transformers models and resolving which
+model (and chunks column) is currently active for ingest and search.
+
+Every model writes to its own chunks column (see app/reembed.py), so a
+model switch is a flip of the 'active' row in embedding_models rather than
+a wipe and re-ingest.
+"""
+import os
+import re
+import threading
+import time
+from typing import NamedTuple
+
+from sentence_transformers import SentenceTransformer
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Model of the original 'embedding' column (384-dimensional, 50+ languages including Polish).
+# Other models are added with the re-embedding job, not by changing this value.
+DEFAULT_EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+DEFAULT_EMBEDDING_COLUMN = "embedding"
+
+# How long a process keeps using a cached active model before re-reading it
+ACTIVE_MODEL_TTL_SECONDS = float(os.getenv("ACTIVE_MODEL_TTL_SECONDS", "10"))
+
+# Texts encoded once after loading a model, so the first real request
+# does not pay for lazy initialisation (kernels, tokenizer caches)
+WARMUP_TEXTS = ["warmup"] * 8
+
+
+class EmbeddingModel(NamedTuple):
+    name: str
+    column: str
+    dim: int
+
+
+_models: dict[str, SentenceTransformer] = {}
+_models_lock = threading.Lock()
+
+_active_model: EmbeddingModel | None = None
+_active_model_checked_at = 0.0
+
+
+def load_model(name: str = DEFAULT_EMBEDDING_MODEL) -> SentenceTransformer:
+    """
+    Load a sentence-transformers model once per process.
+    """
+    # Loaded models are returned without the lock, so a request never waits
+    # for another model being loaded in the background
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        if name not in _models:
+            logger.info("Loading sentence-transformers model: %s...", name)
+            _models[name] = SentenceTransformer(name)
+            logger.info("Model %s loaded successfully!", name)
+        return _models[name]
+
+
+def get_embedding(text: str, normalize: bool = False, model_name: str = DEFAULT_EMBEDDING_MODEL) -> list[float]:
+    """
+    Generate embedding using local sentence-transformers model.
+    Returns a list of floats (unit length if normalize=True).
+    """
+    embedding = load_model(model_name).encode(text, normalize_embeddings=normalize)
+    return embedding.tolist()
+
+
+def get_embeddings(texts: list[str], normalize: bool = False, model_name: str = DEFAULT_EMBEDDING_MODEL) -> list[list[float]]:
+    """
+    Batch variant of get_embedding: one encode() call for many texts.
+    """
+    if not texts:
+        return []
+    embeddings = load_model(model_name).encode(texts, normalize_embeddings=normalize)
+    return embeddings.tolist()
+
+
+def warm_up(name: str):
+    """
+    Load a model and run a warmup batch through it.
+    """
+    load_model(name)
+    get_embeddings(WARMUP_TEXTS, model_name=name)
+
+
+def preload_models(cursor):
+    """
+    Load and warm up the active model and any model a re-embedding job is
+    building, so this process has the new model before the job flips it.
+    """
+    cursor.execute("SELECT name FROM embedding_models WHERE status IN ('active', 'building') ORDER BY name;")
+    for (name,) in cursor.fetchall():
+        if name not in _models:
+            warm_up(name)
+
+
+def column_for_model(name: str) -> str:
+    """
+    chunks column that stores embeddings of a model, e.g.
+    'intfloat/multilingual-e5-small' -> 'embedding_intfloat_multilingual_e5_small'.
+    """
+    slug = re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+    # Postgres truncates identifiers at 63 bytes
+    return f"embedding_{slug}"[:63]
+
+
+def get_active_model(cursor) -> EmbeddingModel:
+    """
+    Model currently used for ingest and search, cached for ACTIVE_MODEL_TTL_SECONDS.
+    """
+    global _active_model, _active_model_checked_at
+
+    if _active_model is not None and time.monotonic() - _active_model_checked_at < ACTIVE_MODEL_TTL_SECONDS:
+        return _active_model
+
+    cursor.execute("SELECT name, column_name, dim FROM embedding_models WHERE status = 'active';")
+    row = cursor.fetchone()
+    if row:
+        _active_model = EmbeddingModel(name=row[0], column=row[1], dim=row[2])
+    else:
+        _active_model = EmbeddingModel(name=DEFAULT_EMBEDDING_MODEL, column=DEFAULT_EMBEDDING_COLUMN, dim=384)
+    _active_model_checked_at = time.monotonic()
+    return _active_model
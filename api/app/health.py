@@ -0,0 +1,105 @@
+"""
+Liveness and readiness probes.
+
+/healthz answers as soon as the process serves HTTP; /readyz only once the
+background startup (migrations, model load + warmup, search index) is done
+and the database answers, so orchestrators route traffic to warm replicas only.
+If startup gives up after its retries, /healthz fails too so the process is
+restarted. Endpoints that need the model depend on require_ready().
+"""
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+
+import logging
+from app.db import get_db_connection
+from app.vector_index import SEARCH_BACKEND
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["health"])
+
+# Seconds /readyz waits for a database connection
+READINESS_DB_TIMEOUT_SECONDS = 2
+
+# Startup components, flipped to True by mark_ready()
+readiness: dict[str, bool] = {
+    "migrations": False,
+    "model": False,
+    "search_index": SEARCH_BACKEND != "mmap",
+}
+startup_error: Optional[str] = None
+startup_fatal = False
+
+
+def mark_ready(component: str):
+    readiness[component] = True
+    logger.info("Startup: %s ready", component)
+
+
+def mark_failed(error: Exception, fatal: bool = False):
+    """
+    Record a startup failure; fatal=True once startup stopped retrying.
+    """
+    global startup_error, startup_fatal
+    startup_error = str(error)
+    startup_fatal = fatal
+
+
+def mark_started():
+    """
+    Clear the error of an earlier failed startup attempt.
+    """
+    global startup_error
+    startup_error = None
+
+
+async def require_ready():
+    """
+    Dependency for endpoints that need the schema and the embedding model.
+    Answers 503 during startup instead of loading the model inside a request.
+    """
+    if not (readiness["migrations"] and readiness["model"]):
+        raise HTTPException(status_code=503, detail="Service is starting up", headers={"Retry-After": "5"})
+
+
+def ping_database() -> bool:
+    try:
+        conn = get_db_connection(connect_timeout=READINESS_DB_TIMEOUT_SECONDS)
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1;")
+        cursor.close()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.warning("Readiness database check failed: %s", e)
+        return False
+
+
+@router.get("/healthz")
+async def healthz():
+    """
+    Liveness: the process is up and the event loop responds.
+    Fails once startup gave up retrying, so the process gets restarted.
+    """
+    if startup_fatal:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": startup_error})
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz():
+    """
+    Readiness: startup finished (migrations, model warm) and the database answers.
+    Returns 503 until then.
+    """
+    checks = dict(readiness)
+    checks["database"] = await asyncio.to_thread(ping_database)
+    ready = all(checks.values()) and startup_error is None
+
+    body = {"status": "ready" if ready else "not_ready", "checks": checks}
+    if startup_error:
+        body["error"] = startup_error
+    return JSONResponse(status_code=200 if ready else 503, content=body)
@@ -0,0 +1,173 @@
+"""
+Shared document/chunk storage used by the ingest endpoints.
+"""
+import hashlib
+from typing import Any, Optional
+
+from psycopg import sql
+from psycopg.types.json import Jsonb
+
+# Chunking parameters (~60 word fragments, 2-3 sentences, with 15 word overlap)
+CHUNK_SIZE = 60
+CHUNK_OVERLAP = 15
+
+# Inserts retried when the conflicting document is gone before it can be
+# looked up (deleted or replaced by another request in between)
+INSERT_ATTEMPTS = 3
+
+
+def content_hash(body: str) -> Optional[str]:
+    """
+    sha256 (hex) of a document body, stored in documents.content_hash.
+    Blank bodies get no hash, so they never count as duplicates of each other.
+    """
+    if not body.strip():
+        return None
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def find_existing_document(
+    cursor,
+    collection: str,
+    url: Optional[str] = None,
+    body_hash: Optional[str] = None
+) -> Optional[tuple[int, int]]:
+    """
+    Look up an already ingested document by normalized URL (its own or one
+    recorded in document_urls) or content hash within a collection, all
+    served by unique indexes.
+    Returns (document_id, chunk_count) or None.
+    """
+    if url is None and body_hash is None:
+        return None
+    
+    cursor.execute(
+        """
+        SELECT id FROM (
+            SELECT id FROM documents 
+            WHERE collection = %s
+              AND (url_key = normalize_url(%s) OR content_hash = %s)
+            UNION ALL
+            SELECT document_id FROM document_urls
+            WHERE collection = %s AND url_key = normalize_url(%s)
+        ) AS matches
+        ORDER BY id
+        LIMIT 1;
+        """,
+        (collection, url, body_hash, collection, url)
+    )
+    existing = cursor.fetchone()
+    if not existing:
+        return None
+    
+    # Count existing chunks for this document
+    cursor.execute(
+        "SELECT COUNT(*) FROM chunks WHERE collection = %s AND document_id = %s;",
+        (collection, existing[0])
+    )
+    return existing[0], cursor.fetchone()[0]
+
+
+def find_documents_by_urls(cursor, collection: str, urls: list[str]) -> dict[str, tuple[int, Optional[str], Optional[str]]]:
+    """
+    Batch URL lookup: url (as given) -> (document_id, etag, last_modified)
+    for every URL already ingested into the collection. Index probes only.
+    
+    URLs recorded in document_urls come without validators: the document
+    was fetched from another URL, so its ETag/Last-Modified do not apply.
+    """
+    cursor.execute(
+        """
+        SELECT u.url, m.id, m.etag, m.last_modified
+        FROM unnest(%s::text[]) AS u(url)
+        JOIN LATERAL (
+            SELECT d.id, d.metadata->>'etag' AS etag, d.metadata->>'last_modified' AS last_modified
+            FROM documents d
+            WHERE d.collection = %s AND d.url_key = normalize_url(u.url)
+            UNION ALL
+            SELECT a.document_id, NULL, NULL
+            FROM document_urls a
+            WHERE a.collection = %s AND a.url_key = normalize_url(u.url)
+            LIMIT 1
+        ) AS m ON true;
+        """,
+        (urls, collection, collection)
+    )
+    return {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+
+
+def add_document_url(cursor, collection: str, document_id: int, url: Optional[str]):
+    """
+    Record another URL of an existing document, e.g. the same article
+    published under a second address and skipped by its content hash.
+    No-op for a missing URL or one that already belongs to a document.
+    """
+    if not url:
+        return
+    
+    cursor.execute(
+        """
+        INSERT INTO document_urls (collection, url_key, document_id)
+        SELECT %s, normalize_url(%s), %s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM documents WHERE collection = %s AND url_key = normalize_url(%s)
+        )
+        ON CONFLICT DO NOTHING;
+        """,
+        (collection, url, document_id, collection, url)
+    )
+
+
+def insert_document(
+    cursor,
+    title: str,
+    metadata: dict[str, Any],
+    collection: str,
+    body_hash: Optional[str] = None
+) -> Optional[int]:
+    """
+    Insert a document record (without body - chunks contain the text).
+    
+    Returns the new document id, or None if a document with the same
+    normalized URL or content hash already exists in the collection.
+    The unique indexes make this safe against concurrent ingests.
+    """
+    cursor.execute(
+        """
+        INSERT INTO documents (title, body, metadata, embedding, collection, content_hash)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT DO NOTHING
+        RETURNING id;
+        """,
+        (title, "", Jsonb(metadata), None, collection, body_hash)  # Empty body, no embedding for document
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def insert_chunks(
+    cursor,
+    document_id: int,
+    collection: str,
+    title: str,
+    metadata: dict[str, Any],
+    chunks: list[str],
+    embeddings: list[list[float]],
+    column: str,
+    start_index: int = 0
+) -> int:
+    """
+    Insert chunks with their embeddings in one executemany() round trip.
+    Rows are routed to the collection's partition and the given embedding column.
+    """
+    cursor.executemany(
+        sql.SQL("""
+        INSERT INTO chunks (collection, document_id, chunk_index, title, body, metadata, {})
+        VALUES (%s, %s, %s, %s, %s, %s, %s);
+        """).format(sql.Identifier(column)),
+        [
+            (collection, document_id, start_index + idx, title, chunk, Jsonb(metadata), embedding)
+            for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings))
+        ]
+    )
+    return len(chunks)
@@ -0,0 +1,129 @@
+"""
+Non-blocking logging setup.
+
+Request threads only enqueue records (QueueHandler); a background
+QueueListener formats them and does the file/console I/O, so disk stalls
+never reach the event loop. The file gets one JSON object per line and is
+rotated by size. Per-request records (logged with extra={"sample": True})
+are rate limited, and beyond the limit only a random sample is kept.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+
+# Per-request records logged in full per second, then only LOG_SAMPLE_RATE of them
+LOG_REQUESTS_PER_SECOND = float(os.getenv("LOG_REQUESTS_PER_SECOND", "50"))
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRS = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+_listener: QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line with the extra= fields as top-level keys.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key != "sample":
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler that enqueues the record as is.
+
+    The stock prepare() formats the message in the calling thread; here
+    msg % args is left to the listener thread. Callers must pass args that
+    are not mutated afterwards (ids, strings, request values).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class RequestLogSampler(logging.Filter):
+    """
+    Token bucket for records marked extra={"sample": True}; once the bucket
+    is empty they pass with probability sample_rate. Warnings and errors
+    always pass.
+    """
+
+    def __init__(self, per_second: float, sample_rate: float):
+        super().__init__()
+        self.per_second = per_second
+        self.sample_rate = sample_rate
+        self._tokens = per_second
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sample", False) or record.levelno >= logging.WARNING:
+            return True
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.per_second, self._tokens + (now - self._updated) * self.per_second)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+
+        return random.random() < self.sample_rate
+
+
+def setup_logging():
+    """
+    Route all logging through a queue to rotating JSON file + console handlers.
+    Safe to call more than once (e.g. on --reload).
+    """
+    global _listener
+
+    if _listener is not None:
+        return
+
+    file_handler = RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(RequestLogSampler(LOG_REQUESTS_PER_SECOND, LOG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued on interpreter exit
+    atexit.register(_listener.stop)
@@ -2,60 +2,169 @@
 FastAPI application for vector embeddings demo with pgvector.
 Now using LOCAL sentence-transformers model (no OpenAI, no API key needed).
 """
+import asyncio
 import os
+import time
 from typing import Any, Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
-from psycopg.types.json import Jsonb
+
+# Load environment variables first: app modules read their settings
+# (LOG_*, SEARCH_BACKEND, ...) at import time
+load_dotenv()
+
+from fastapi import Depends, FastAPI, HTTPException
+from pydantic import BaseModel, Field
+from psycopg import sql
 
 import logging
+from app.logging_config import setup_logging
 from app.db import get_db_connection, init_database
 from app.chunking import chunk_text
+from app.context import build_passages
+from app.vector_index import SEARCH_BACKEND, get_vector_index
+from app.embeddings import (
+    ACTIVE_MODEL_TTL_SECONDS,
+    EmbeddingModel,
+    get_embedding,
+    get_embeddings,
+    get_active_model,
+    preload_models,
+    warm_up,
+)
+from app.ingest import (
+    CHUNK_SIZE, CHUNK_OVERLAP, INSERT_ATTEMPTS, add_document_url, content_hash, find_documents_by_urls,
+    find_existing_document, insert_document, insert_chunks
+)
+from app.reembed import router as reembed_router, resume_jobs
+from app.url_ingest import router as url_ingest_router
+from app.stream_ingest import router as stream_ingest_router
+from app.health import (
+    router as health_router,
+    readiness,
+    require_ready,
+    mark_ready,
+    mark_failed,
+    mark_started,
+)
 from app.player import router as player_router  # Import Player router
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("app.log"),
-        logging.StreamHandler()
-    ]
+from app.collection import (
+    router as collection_router,
+    DEFAULT_COLLECTION,
+    get_collection_metric,
+    uses_normalized_embeddings,
+    distance_operator,
+    set_search_ef,
+    MAX_SEARCH_LIMIT,
 )
+
+# Configure logging (queue-based, JSON lines in app.log, see app/logging_config.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Startup attempts before giving up (and failing /healthz), with exponential
+# backoff between them capped at STARTUP_RETRY_MAX_SECONDS
+STARTUP_MAX_ATTEMPTS = int(os.getenv("STARTUP_MAX_ATTEMPTS", "10"))
+STARTUP_RETRY_MAX_SECONDS = 30
 
-# Load the local sentence-transformers model once at startup
-# Using paraphrase-multilingual-MiniLM-L12-v2 (384-dimensional, 50+ languages including Polish)
-logger.info("Loading sentence-transformers model: paraphrase-multilingual-MiniLM-L12-v2...")
-model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-logger.info("Model loaded successfully!")
+def warm_up_model() -> EmbeddingModel:
+    """
+    Load the active sentence-transformers model and run a warmup batch.
+    (paraphrase-multilingual-MiniLM-L12-v2 unless a re-embedding job switched it)
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    active = get_active_model(cursor)
+    cursor.close()
+    conn.close()
+    
+    warm_up(active.name)
+    return active
 
 
-def get_embedding(text: str) -> list[float]:
+def preload_embedding_models():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        preload_models(cursor)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+async def watch_embedding_models():
     """
-    Generate embedding using local sentence-transformers model.
-    Returns a list of 384 floats.
+    Load models a re-embedding job is building ahead of its flip, so no
+    request has to load the new model inline.
     """
-    embedding = model.encode(text)
-    return embedding.tolist()
+    while True:
+        await asyncio.sleep(ACTIVE_MODEL_TTL_SECONDS)
+        try:
+            await asyncio.to_thread(preload_embedding_models)
+        except Exception as e:
+            logger.warning("Preloading embedding models failed: %s", e)
+
+
+async def startup():
+    """
+    Background startup: the app serves /healthz immediately and reports
+    ready on /readyz once all of this is done.
+    
+    A failing step (e.g. the database is not reachable yet) is retried with
+    exponential backoff; steps that already finished are not repeated.
+    After STARTUP_MAX_ATTEMPTS failures /healthz fails as well, so the
+    orchestrator restarts the process.
+    """
+    active = None
+    jobs_resumed = False
+    
+    for attempt in range(1, STARTUP_MAX_ATTEMPTS + 1):
+        try:
+            if not readiness["migrations"]:
+                await asyncio.to_thread(init_database)
+                mark_ready("migrations")
+            
+            if not readiness["model"]:
+                active = await asyncio.to_thread(warm_up_model)
+                mark_ready("model")
+            
+            if not jobs_resumed:
+                await asyncio.to_thread(resume_jobs)
+                jobs_resumed = True
+            
+            if not readiness["search_index"]:
+                logger.info("Search backend: mmap, snapshotting default collection...")
+                index = get_vector_index(DEFAULT_COLLECTION, active.column, active.dim)
+                await asyncio.to_thread(index.refresh)
+                mark_ready("search_index")
+            
+            mark_started()
+            break
+        except Exception as e:
+            fatal = attempt == STARTUP_MAX_ATTEMPTS
+            mark_failed(e, fatal=fatal)
+            logger.error(
+                "Startup failed (attempt %s/%s): %s", attempt, STARTUP_MAX_ATTEMPTS, e,
+                extra={"event": "startup_error"}
+            )
+            if fatal:
+                return
+            await asyncio.sleep(min(2 ** (attempt - 1), STARTUP_RETRY_MAX_SECONDS))
+    
+    await watch_embedding_models()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Startup and shutdown events for the FastAPI app.
-    Initialize database on startup.
+    Migrations and model loading run in a background task (see startup()).
     """
-    logger.info("Starting up: initializing database...")
-    init_database()
+    logger.info("Starting up: migrations and model warmup run in the background...")
+    startup_task = asyncio.create_task(startup())
     yield
+    startup_task.cancel()
     logger.info("Shutting down...")
 
 
@@ -69,6 +178,11 @@ app = FastAPI(
 
 # Register Player router
 app.include_router(player_router)
+app.include_router(collection_router)
+app.include_router(reembed_router)
+app.include_router(url_ingest_router)
+app.include_router(stream_ingest_router)
+app.include_router(health_router)
 
 
 # Request/Response models
@@ -76,6 +190,7 @@ class IngestRequest(BaseModel):
     title: str
     body: str
     metadata: Optional[dict[str, Any]] = {}
+    collection: str = DEFAULT_COLLECTION
 
 
 class IngestResponse(BaseModel):
@@ -84,6 +199,16 @@ class IngestResponse(BaseModel):
     chunks_inserted: int
 
 
+class KnownDocumentsRequest(BaseModel):
+    urls: list[str] = Field(..., min_length=1, max_length=10000)
+    collection: str = DEFAULT_COLLECTION
+
+
+class KnownDocumentsResponse(BaseModel):
+    known: dict[str, int]  # url (as given) -> document_id
+    unknown: list[str]
+
+
 class SearchResult(BaseModel):
     chunk_id: int
     document_id: int
@@ -99,6 +224,25 @@ class SearchResponse(BaseModel):
     results: list[SearchResult]
 
 
+class ContextPassage(BaseModel):
+    document_id: int
+    title: str
+    metadata: Optional[dict[str, Any]]
+    chunk_start: int
+    chunk_end: int
+    hit_chunk_indexes: list[int]
+    body: str
+    distance: float
+    tokens: int
+
+
+class ContextResponse(BaseModel):
+    query: str
+    passages: list[ContextPassage]
+    total_tokens: int
+    truncated: bool
+
+
 @app.get("/")
 async def root():
     """
@@ -107,111 +251,129 @@ async def root():
     return {"status": "ok", "message": "Vector embeddings API is running"}
 
 
-@app.post("/ingest", response_model=IngestResponse)
+@app.post("/ingest", response_model=IngestResponse, dependencies=[Depends(require_ready)])
 async def ingest_document(request: IngestRequest):
     """
     Ingest a document with RAG-ready chunking: generate embeddings for text chunks and store in PostgreSQL.
     
     - Chunks the document body into ~60 word fragments (2-3 sentences) with 15 word overlap
-    - Uses sentence-transformers to generate embedding for each chunk
-    - Stores chunks with embeddings in pgvector (384 dimensions)
+    - Uses sentence-transformers to generate embeddings for all chunks in one batch
+    - Stores chunks with embeddings in pgvector (column of the active embedding model)
     - Stores document metadata in documents table
+    - Idempotent: a document with the same normalized URL or body (sha256) in the
+      collection is not stored again; the existing document_id is returned instead
+      (a new URL of a known body is recorded as another URL of that document)
     - Returns document_id and number of chunks created
     """
+    started = time.perf_counter()
     try:
         # Connect to database
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Check if document with this URL already exists
-        if request.metadata and 'url' in request.metadata:
-            cursor.execute(
-                """
-                SELECT id FROM documents 
-                WHERE metadata->>'url' = %s;
-                """,
-                (request.metadata['url'],)
+        metric = get_collection_metric(cursor, request.collection)
+        normalize = uses_normalized_embeddings(metric)
+        active = get_active_model(cursor)
+        
+        url = (request.metadata or {}).get("url")
+        body_hash = content_hash(request.body)
+        
+        # Check if a document with this URL or body already exists in the collection (index lookup)
+        existing = find_existing_document(cursor, request.collection, url, body_hash)
+        if existing:
+            # Same body under a new URL: remember the URL so it counts as known
+            add_document_url(cursor, request.collection, existing[0], url)
+            cursor.close()
+            conn.close()
+            logger.info(
+                "Document '%s' already exists (ID: %s). Skipping.", url or request.title, existing[0],
+                extra={"event": "ingest_duplicate", "collection": request.collection, "document_id": existing[0], "sample": True}
             )
-            existing = cursor.fetchone()
-            if existing:
-                # Count existing chunks for this document
-                cursor.execute(
-                    "SELECT COUNT(*) FROM chunks WHERE document_id = %s;",
-                    (existing[0],)
-                )
-                chunk_count = cursor.fetchone()[0]
-                
-                cursor.close()
-                conn.close()
-                logger.info(f"Document with URL '{request.metadata['url']}' already exists (ID: {existing[0]}). Skipping.")
-                return IngestResponse(status="ok", document_id=existing[0], chunks_inserted=chunk_count)
+            return IngestResponse(status="ok", document_id=existing[0], chunks_inserted=existing[1])
         
-        # Insert document record (without body - chunks will contain the text)
-        logger.info(f"Ingesting document: '{request.title}' | Metadata: {request.metadata}")
-        cursor.execute(
-            """
-            INSERT INTO documents (title, body, metadata, embedding)
-            VALUES (%s, %s, %s, %s)
-            RETURNING id;
-            """,
-            (request.title, "", Jsonb(request.metadata), None)  # Empty body, no embedding for document
+        logger.info(
+            "Ingesting document: '%s' | Collection: %s", request.title, request.collection,
+            extra={"event": "ingest", "collection": request.collection, "url": url, "sample": True}
         )
         
-        document_id = cursor.fetchone()[0]
+        # Chunk the text and embed all chunks in one batch (before touching the database)
+        chunks = chunk_text(request.body, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+        embeddings = get_embeddings(chunks, normalize=normalize, model_name=active.name)
         
-        # Chunk the text
-        chunks = chunk_text(request.body, chunk_size=60, overlap=15)
-        logger.info(f"Document split into {len(chunks)} chunks")
+        for _ in range(INSERT_ATTEMPTS):
+            with conn.transaction():
+                # Insert document record (without body - chunks will contain the text);
+                # None means a concurrent request stored the same URL/body first
+                document_id = insert_document(cursor, request.title, request.metadata, request.collection, body_hash)
+                if document_id is not None:
+                    chunks_inserted = insert_chunks(
+                        cursor, document_id, request.collection, request.title, request.metadata,
+                        chunks, embeddings, active.column
+                    )
+            if document_id is not None:
+                break
+            # The conflicting document may already be gone again (e.g. replaced
+            # by /ingest/urls); then the insert is simply retried
+            existing = find_existing_document(cursor, request.collection, url, body_hash)
+            if existing is not None:
+                break
         
-        # Insert each chunk with its embedding
-        chunks_inserted = 0
-        for idx, chunk in enumerate(chunks):
-            # Generate embedding for this chunk
-            chunk_embedding = get_embedding(chunk)
-            
-            # Insert chunk
-            cursor.execute(
-                """
-                INSERT INTO chunks (document_id, chunk_index, title, body, metadata, embedding)
-                VALUES (%s, %s, %s, %s, %s, %s);
-                """,
-                (document_id, idx, request.title, chunk, Jsonb(request.metadata), chunk_embedding)
+        if document_id is None:
+            if existing is None:
+                cursor.close()
+                conn.close()
+                raise HTTPException(
+                    status_code=409,
+                    detail="Document kept conflicting with concurrent changes to the same URL or body, please retry"
+                )
+            add_document_url(cursor, request.collection, existing[0], url)
+            cursor.close()
+            conn.close()
+            logger.info(
+                "Document '%s' was ingested concurrently (ID: %s). Skipping.", url or request.title, existing[0],
+                extra={"event": "ingest_duplicate", "collection": request.collection, "document_id": existing[0], "sample": True}
             )
-            chunks_inserted += 1
+            return IngestResponse(status="ok", document_id=existing[0], chunks_inserted=existing[1])
         
         cursor.close()
         conn.close()
         
-        logger.info(f"Document inserted successfully with ID: {document_id}, chunks: {chunks_inserted}")
+        logger.info(
+            "Document inserted successfully with ID: %s, chunks: %s", document_id, chunks_inserted,
+            extra={
+                "event": "ingest_done",
+                "document_id": document_id,
+                "chunks": chunks_inserted,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "sample": True
+            }
+        )
         return IngestResponse(status="ok", document_id=document_id, chunks_inserted=chunks_inserted)
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error during ingestion: {e}")
+        logger.error("Error during ingestion: %s", e, extra={"event": "ingest_error"})
         raise HTTPException(status_code=500, detail=f"Failed to ingest document: {str(e)}")
 
 
-@app.get("/search", response_model=SearchResponse)
-async def search_documents(q: str, limit: int = 5):
+def search_vector_index(
+    cursor,
+    index,
+    collection: str,
+    query_embedding: list[float],
+    metric: str,
+    limit: int
+) -> list[tuple]:
     """
-    Semantic search on text chunks: find most relevant chunks using vector similarity.
+    Top-`limit` chunk rows (with distance) from the mmap index.
     
-    - Generates embedding for the query text using LOCAL model
-    - Searches chunks table (not documents) using L2 distance
-    - Returns most similar chunks with document context
-    - Perfect for RAG: returns precise, relevant text fragments
+    Chunks deleted in Postgres since the snapshot (e.g. re-crawled pages)
+    are tombstoned in the index and the search is repeated, so the result
+    is still `limit` rows long whenever the collection has that many.
     """
-    try:
-        # Generate embedding for the search query using local model
-        logger.info(f"Searching for: '{q}' | Limit: {limit}")
-        query_embedding = get_embedding(q)
-        
-        # Connect to database and perform similarity search on chunks
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Search for similar chunks using L2 distance
-        # The <-> operator calculates L2 distance between vectors
-        # Lower distance = more similar
+    while True:
+        distances = dict(index.search(query_embedding, metric, limit))
         cursor.execute(
             """
             SELECT 
@@ -220,16 +382,92 @@ async def search_documents(q: str, limit: int = 5):
                 c.chunk_index,
                 c.title,
                 c.body,
-                c.metadata,
-                c.embedding <-> %s::vector AS distance
+                c.metadata
             FROM chunks c
-            ORDER BY c.embedding <-> %s::vector
-            LIMIT %s;
+            WHERE c.collection = %s AND c.id = ANY(%s);
             """,
-            (query_embedding, query_embedding, limit)
+            (collection, list(distances))
         )
+        found = cursor.fetchall()
         
-        rows = cursor.fetchall()
+        deleted = distances.keys() - {row[0] for row in found}
+        if not deleted:
+            break
+        index.forget(deleted)
+    
+    return sorted(
+        (row + (distances[row[0]],) for row in found),
+        key=lambda row: row[6]
+    )
+
+
+@app.get("/search", response_model=SearchResponse, dependencies=[Depends(require_ready)])
+async def search_documents(q: str, limit: int = 5, collection: str = DEFAULT_COLLECTION):
+    """
+    Semantic search on text chunks: find most relevant chunks using vector similarity.
+    
+    - Generates embedding for the query text using LOCAL model
+    - Searches only the collection's chunks partition using its metric (L2 by default)
+    - Returns most similar chunks with document context
+    - Perfect for RAG: returns precise, relevant text fragments
+    - Uses the HNSW index: results are approximate nearest neighbours
+      (recall tuned with HNSW_EF_SEARCH), limit is at most MAX_SEARCH_LIMIT
+    """
+    if limit < 1 or limit > MAX_SEARCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_SEARCH_LIMIT}")
+    
+    try:
+        started = time.perf_counter()
+        logger.info(
+            "Searching for: '%s' | Collection: %s | Limit: %s", q, collection, limit,
+            extra={"event": "search", "collection": collection, "limit": limit, "sample": True}
+        )
+        
+        # Connect to database and perform similarity search on chunks
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        metric = get_collection_metric(cursor, collection)
+        
+        # Generate embedding for the search query using local model
+        active = get_active_model(cursor)
+        query_embedding = get_embedding(q, normalize=uses_normalized_embeddings(metric), model_name=active.name)
+        
+        index = get_vector_index(collection, active.column, active.dim) if SEARCH_BACKEND == "mmap" else None
+        if index is not None and not index.ready:
+            # First search of a collection/model: build the snapshot in the
+            # background and answer from pgvector until it is mapped
+            index.refresh_if_stale()
+            index = None
+        
+        if index is not None:
+            # Top-k in process (off the event loop), Postgres only for bodies and metadata
+            rows = await asyncio.to_thread(search_vector_index, cursor, index, collection, query_embedding, metric, limit)
+        else:
+            # Search for similar chunks with the collection's distance operator
+            # (<-> L2, <=> cosine, <#> negative inner product).
+            # Lower distance = more similar
+            with conn.transaction():
+                set_search_ef(cursor, limit)
+                cursor.execute(
+                    sql.SQL("""
+                    SELECT 
+                        c.id as chunk_id,
+                        c.document_id,
+                        c.chunk_index,
+                        c.title,
+                        c.body,
+                        c.metadata,
+                        c.{col} {op} %s::vector AS distance
+                    FROM chunks c
+                    WHERE c.collection = %s
+                    ORDER BY c.{col} {op} %s::vector
+                    LIMIT %s;
+                    """).format(col=sql.Identifier(active.column), op=distance_operator(metric)),
+                    (query_embedding, collection, query_embedding, limit)
+                )
+                
+                rows = cursor.fetchall()
         
         # Build results
         results = []
@@ -247,14 +485,129 @@ async def search_documents(q: str, limit: int = 5):
         cursor.close()
         conn.close()
         
-        logger.info(f"Search completed. Found {len(results)} chunk results.")
+        logger.info(
+            "Search completed. Found %s chunk results.", len(results),
+            extra={
+                "event": "search_done",
+                "results": len(results),
+                "backend": "mmap" if index is not None else "pgvector",
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "sample": True
+            }
+        )
         return SearchResponse(query=q, results=results)
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error during search: {e}")
+        logger.error("Error during search: %s", e, extra={"event": "search_error"})
         raise HTTPException(status_code=500, detail=f"Failed to search documents: {str(e)}")
 
 
+@app.get("/search/context", response_model=ContextResponse, dependencies=[Depends(require_ready)])
+async def search_context(
+    q: str,
+    limit: int = 5,
+    neighbors: int = 1,
+    max_tokens: int = 2000,
+    collection: str = DEFAULT_COLLECTION
+):
+    """
+    Assemble a RAG context window from the most relevant chunks.
+    
+    - Finds the top `limit` chunks like /search
+    - Expands every hit by +/- `neighbors` chunks of the same document in the same query
+    - Merges overlapping/adjacent chunks into de-duplicated passages per document
+    - Returns passages ordered by distance, cut to a total of `max_tokens` (estimated)
+    """
+    if limit < 1 or neighbors < 0 or max_tokens < 1:
+        raise HTTPException(status_code=400, detail="limit and max_tokens must be positive, neighbors must not be negative")
+    if limit > MAX_SEARCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be at most {MAX_SEARCH_LIMIT}")
+    
+    try:
+        started = time.perf_counter()
+        logger.info(
+            "Building context for: '%s' | Collection: %s | Limit: %s | Neighbors: %s | Max tokens: %s",
+            q, collection, limit, neighbors, max_tokens,
+            extra={"event": "search_context", "collection": collection, "limit": limit, "sample": True}
+        )
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        metric = get_collection_metric(cursor, collection)
+        active = get_active_model(cursor)
+        query_embedding = get_embedding(q, normalize=uses_normalized_embeddings(metric), model_name=active.name)
+        
+        # Top-k hits plus their neighbours in a single round trip.
+        # Neighbour rows inherit the best distance of the hit(s) they surround.
+        with conn.transaction():
+            set_search_ef(cursor, limit)
+            cursor.execute(
+                sql.SQL("""
+                WITH hits AS (
+                    SELECT
+                        c.document_id,
+                        c.chunk_index,
+                        c.{col} {op} %s::vector AS distance
+                    FROM chunks c
+                    WHERE c.collection = %s
+                    ORDER BY c.{col} {op} %s::vector
+                    LIMIT %s
+                )
+                SELECT
+                    c.document_id,
+                    c.chunk_index,
+                    c.title,
+                    c.body,
+                    c.metadata,
+                    MIN(h.distance) AS distance,
+                    BOOL_OR(h.chunk_index = c.chunk_index) AS is_hit
+                FROM hits h
+                JOIN chunks c
+                    ON c.collection = %s
+                   AND c.document_id = h.document_id
+                   AND c.chunk_index BETWEEN h.chunk_index - %s AND h.chunk_index + %s
+                GROUP BY c.collection, c.id
+                ORDER BY c.document_id, c.chunk_index;
+                """).format(col=sql.Identifier(active.column), op=distance_operator(metric)),
+                (query_embedding, collection, query_embedding, limit, collection, neighbors, neighbors)
+            )
+            
+            rows = cursor.fetchall()
+        
+        cursor.close()
+        conn.close()
+        
+        passages, total_tokens, truncated = build_passages(
+            rows, max_overlap=CHUNK_OVERLAP, max_tokens=max_tokens
+        )
+        
+        logger.info(
+            "Context built from %s chunks: %s passages, ~%s tokens.", len(rows), len(passages), total_tokens,
+            extra={
+                "event": "search_context_done",
+                "passages": len(passages),
+                "tokens": total_tokens,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "sample": True
+            }
+        )
+        return ContextResponse(
+            query=q,
+            passages=[ContextPassage(**p) for p in passages],
+            total_tokens=total_tokens,
+            truncated=truncated
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error during context search: %s", e, extra={"event": "search_context_error"})
+        raise HTTPException(status_code=500, detail=f"Failed to build search context: {str(e)}")
+
+
 @app.get("/documents")
 async def list_documents():
     """
@@ -288,3 +641,34 @@ async def list_documents():
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list documents: {str(e)}")
+
+
+@app.post("/documents/known", response_model=KnownDocumentsResponse, dependencies=[Depends(require_ready)])
+async def known_documents(request: KnownDocumentsRequest):
+    """
+    Batch check which URLs are already ingested into a collection.
+    
+    URLs are compared after normalization (scheme/host case, default port,
+    fragment, trailing slash), in one indexed query. URLs that were skipped
+    as duplicates of another document's body count as known. Lets crawlers and the
+    n8n workflow skip known pages before fetching them.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        get_collection_metric(cursor, request.collection)  # 404 for unknown collections
+        urls = list(dict.fromkeys(request.urls))
+        known = find_documents_by_urls(cursor, request.collection, urls)
+        cursor.close()
+        conn.close()
+        
+        return KnownDocumentsResponse(
+            known={url: found[0] for url, found in known.items()},
+            unknown=[url for url in urls if url not in known]
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error checking known documents: %s", e, extra={"event": "documents_known_error"})
+        raise HTTPException(status_code=500, detail=f"Failed to check documents: {str(e)}")
@@ -69,7 +69,7 @@ async def create_player(profile: PlayerProfileCreate):
         metadata["generated_at"] = datetime.utcnow().isoformat()
         
         # UPSERT - wstaw nowy lub zaktualizuj istniejący
-        logger.info(f"Creating/updating player profile: '{profile.name}'")
+        logger.info("Creating/updating player profile: '%s'", profile.name)
         cursor.execute(
             """
             INSERT INTO players (name, summary, metadata)
@@ -113,7 +113,7 @@ async def create_player(profile: PlayerProfileCreate):
             updated_at=player_data[5]
         )
         
-        logger.info(f"Player profile {status} successfully with ID: {player_id}")
+        logger.info("Player profile %s successfully with ID: %s", status, player_id)
         return PlayerCreateFullResponse(
             status=status,
             player=player_response,
@@ -121,7 +121,7 @@ async def create_player(profile: PlayerProfileCreate):
         )
         
     except Exception as e:
-        logger.error(f"Error creating/updating player profile: {e}")
+        logger.error("Error creating/updating player profile: %s", e, extra={"event": "player_upsert_error"})
         raise HTTPException(status_code=500, detail=f"Błąd podczas tworzenia/aktualizacji profilu: {str(e)}")
 
 
@@ -167,7 +167,7 @@ async def search_player(name: str):
         return {"found": True, "profile": profile.model_dump()}
         
     except Exception as e:
-        logger.error(f"Error searching player: {e}")
+        logger.error("Error searching player: %s", e, extra={"event": "player_search_error"})
         raise HTTPException(status_code=500, detail=f"Błąd podczas wyszukiwania: {str(e)}")
 
 
@@ -209,7 +209,7 @@ async def get_player(player_id: int):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching player: {e}")
+        logger.error("Error fetching player: %s", e, extra={"event": "player_get_error"})
         raise HTTPException(status_code=500, detail=f"Błąd podczas pobierania profilu: {str(e)}")
 
 
@@ -262,7 +262,7 @@ async def update_player(player_id: int, updates: PlayerProfileUpdate):
         cursor.close()
         conn.close()
         
-        logger.info(f"Player profile updated: ID {player_id}")
+        logger.info("Player profile updated: ID %s", player_id)
         
         return PlayerProfileResponse(
             id=row[0],
@@ -276,7 +276,7 @@ async def update_player(player_id: int, updates: PlayerProfileUpdate):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error updating player: {e}")
+        logger.error("Error updating player: %s", e, extra={"event": "player_update_error"})
         raise HTTPException(status_code=500, detail=f"Błąd podczas aktualizacji profilu: {str(e)}")
 
 
@@ -298,13 +298,13 @@ async def delete_player(player_id: int):
         if not deleted:
             raise HTTPException(status_code=404, detail=f"Piłkarz o ID {player_id} nie został znaleziony")
         
-        logger.info(f"Player profile deleted: '{deleted[0]}' (ID: {player_id})")
+        logger.info("Player profile deleted: '%s' (ID: %s)", deleted[0], player_id)
         return {"status": "deleted", "message": f"Profil piłkarza '{deleted[0]}' został usunięty"}
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting player: {e}")
+        logger.error("Error deleting player: %s", e, extra={"event": "player_delete_error"})
         raise HTTPException(status_code=500, detail=f"Błąd podczas usuwania profilu: {str(e)}")
 
 
@@ -347,5 +347,5 @@ async def list_players(limit: int = 50, offset: int = 0):
         return players
         
     except Exception as e:
-        logger.error(f"Error listing players: {e}")
+        logger.error("Error listing players: %s", e, extra={"event": "player_list_error"})
         raise HTTPException(status_code=500, detail=f"Błąd podczas pobierania listy piłkarzy: {str(e)}")
@@ -0,0 +1,444 @@
+"""
+Online re-embedding for model changes.
+
+A job adds a chunks column for the target model, streams chunks through
+batched encoding in keyset (id) order, checkpoints after every batch so it
+survives restarts, throttles to a configured rate and finally flips the
+'active' model in embedding_models, which is what /ingest and /search read.
+Search keeps using the old column until the flip.
+
+Phases (stored in reembed_jobs.phase):
+    backfill   keyset scan over all chunks from last_chunk_id
+    catchup    chunks inserted by ingest during backfill (column still NULL)
+    index      HNSW index on the new column for every collection (built
+               CONCURRENTLY, so ingest keeps writing meanwhile)
+    flip       switch the active model in one transaction
+    settle     wait until every process saw the flip, embed the last stragglers
+
+Run through the API (POST /reembed) or from the command line:
+    python -m app.reembed intfloat/multilingual-e5-small --batch-size 64 --rate 200
+"""
+import argparse
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from psycopg import sql
+from psycopg.errors import LockNotAvailable
+
+import logging
+from app.db import get_db_connection
+from app.health import require_ready
+from app.collection import get_collection_metric, uses_normalized_embeddings, create_embedding_index
+from app.embeddings import (
+    ACTIVE_MODEL_TTL_SECONDS,
+    EmbeddingModel,
+    column_for_model,
+    get_embeddings,
+    load_model,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/reembed", tags=["reembed"], dependencies=[Depends(require_ready)])
+
+# Advisory lock namespace; the second key is the job id
+REEMBED_LOCK_NAMESPACE = 4029
+
+PHASES = ["backfill", "catchup", "index", "flip", "settle"]
+
+# Adding the model column needs a brief ACCESS EXCLUSIVE lock on every chunks
+# partition. Waiting for it queues all ingest and search behind the waiter,
+# so give up after ADD_COLUMN_LOCK_TIMEOUT and retry a few times instead.
+ADD_COLUMN_LOCK_TIMEOUT = "2s"
+ADD_COLUMN_ATTEMPTS = 5
+
+JOB_COLUMNS = """
+    id, model_name, status, phase, last_chunk_id, processed,
+    batch_size, max_chunks_per_second, error, started_at, updated_at
+"""
+
+
+class ReembedRequest(BaseModel):
+    model: str = Field(..., description="sentence-transformers model name")
+    batch_size: int = Field(64, ge=1, le=1024, description="Chunks per encode() call and checkpoint")
+    max_chunks_per_second: Optional[float] = Field(None, gt=0, description="Throttle (none = unlimited)")
+
+
+class ReembedJobResponse(BaseModel):
+    id: int
+    model_name: str
+    status: str
+    phase: str
+    last_chunk_id: int
+    processed: int
+    batch_size: int
+    max_chunks_per_second: Optional[float]
+    error: Optional[str]
+    started_at: datetime
+    updated_at: datetime
+
+
+def _job_response(row) -> ReembedJobResponse:
+    return ReembedJobResponse(
+        id=row[0],
+        model_name=row[1],
+        status=row[2],
+        phase=row[3],
+        last_chunk_id=row[4],
+        processed=row[5],
+        batch_size=row[6],
+        max_chunks_per_second=row[7],
+        error=row[8],
+        started_at=row[9],
+        updated_at=row[10]
+    )
+
+
+def prepare_model(cursor, model_name: str) -> EmbeddingModel:
+    """
+    Register the target model as 'building' and add its chunks column.
+
+    Adding a nullable column without default only touches the catalog, so
+    the ACCESS EXCLUSIVE lock on chunks is held for milliseconds; it is
+    only requested with a lock_timeout (see ADD_COLUMN_LOCK_TIMEOUT).
+    """
+    cursor.execute("SELECT name, column_name, dim, status FROM embedding_models WHERE name = %s;", (model_name,))
+    row = cursor.fetchone()
+    if row and row[3] == "active":
+        raise HTTPException(status_code=409, detail=f"Model '{model_name}' is already active")
+
+    if row:
+        model = EmbeddingModel(name=row[0], column=row[1], dim=row[2])
+        cursor.execute("UPDATE embedding_models SET status = 'building' WHERE name = %s;", (model_name,))
+    else:
+        dim = load_model(model_name).get_sentence_embedding_dimension()
+        model = EmbeddingModel(name=model_name, column=column_for_model(model_name), dim=dim)
+        cursor.execute(
+            """
+            INSERT INTO embedding_models (name, column_name, dim, status)
+            VALUES (%s, %s, %s, 'building');
+            """,
+            (model.name, model.column, model.dim)
+        )
+
+    for attempt in range(1, ADD_COLUMN_ATTEMPTS + 1):
+        try:
+            with cursor.connection.transaction():
+                cursor.execute("SELECT set_config('lock_timeout', %s, true);", (ADD_COLUMN_LOCK_TIMEOUT,))
+                cursor.execute(
+                    sql.SQL("ALTER TABLE chunks ADD COLUMN IF NOT EXISTS {} vector({});").format(
+                        sql.Identifier(model.column), sql.Literal(model.dim)
+                    )
+                )
+            break
+        except LockNotAvailable:
+            if attempt == ADD_COLUMN_ATTEMPTS:
+                raise HTTPException(
+                    status_code=503,
+                    detail="chunks table is busy (long-running transactions), try again later"
+                )
+            logger.warning(
+                "Adding column %s: chunks is locked, retrying (%s/%s)", model.column, attempt, ADD_COLUMN_ATTEMPTS
+            )
+            time.sleep(attempt)
+    return model
+
+
+def _update_job(cursor, job_id: int, **fields):
+    assignments = sql.SQL(", ").join(
+        sql.SQL("{} = %s").format(sql.Identifier(name)) for name in fields
+    )
+    cursor.execute(
+        sql.SQL("UPDATE reembed_jobs SET {}, updated_at = CURRENT_TIMESTAMP WHERE id = %s;").format(assignments),
+        (*fields.values(), job_id)
+    )
+
+
+def _embed_rows(conn, cursor, job_id: int, model: EmbeddingModel, rows: list[tuple], checkpoint: bool) -> int:
+    """
+    Encode (id, collection, body) rows and write them plus the checkpoint
+    in one transaction, so a restart never skips or repeats a batch.
+    """
+    # Unit-length embeddings for ip/cosine collections, raw for L2
+    groups: dict[bool, list[tuple]] = {}
+    for row in rows:
+        groups.setdefault(uses_normalized_embeddings(get_collection_metric(cursor, row[1])), []).append(row)
+
+    updates = []
+    for normalize, group in groups.items():
+        embeddings = get_embeddings([row[2] for row in group], normalize=normalize, model_name=model.name)
+        updates.extend((embedding, row[1], row[0]) for embedding, row in zip(embeddings, group))
+
+    with conn.transaction():
+        cursor.executemany(
+            sql.SQL("UPDATE chunks SET {} = %s WHERE collection = %s AND id = %s;").format(
+                sql.Identifier(model.column)
+            ),
+            updates
+        )
+        cursor.execute(
+            "UPDATE reembed_jobs SET processed = processed + %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s;",
+            (len(rows), job_id)
+        )
+        if checkpoint:
+            _update_job(cursor, job_id, last_chunk_id=rows[-1][0])
+
+    return len(rows)
+
+
+def _throttle(started: float, count: int, max_chunks_per_second: Optional[float]):
+    if max_chunks_per_second:
+        delay = count / max_chunks_per_second - (time.monotonic() - started)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _backfill(conn, cursor, job_id: int, model: EmbeddingModel, last_chunk_id: int, batch_size: int, rate: Optional[float]):
+    while True:
+        started = time.monotonic()
+        cursor.execute(
+            "SELECT id, collection, body FROM chunks WHERE id > %s ORDER BY id LIMIT %s;",
+            (last_chunk_id, batch_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        _embed_rows(conn, cursor, job_id, model, rows, checkpoint=True)
+        last_chunk_id = rows[-1][0]
+        _throttle(started, len(rows), rate)
+
+
+def _catchup(conn, cursor, job_id: int, model: EmbeddingModel, batch_size: int, rate: Optional[float]):
+    while True:
+        started = time.monotonic()
+        cursor.execute(
+            sql.SQL("SELECT id, collection, body FROM chunks WHERE {} IS NULL ORDER BY id LIMIT %s;").format(
+                sql.Identifier(model.column)
+            ),
+            (batch_size,)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        _embed_rows(conn, cursor, job_id, model, rows, checkpoint=False)
+        _throttle(started, len(rows), rate)
+
+
+def _flip(conn, cursor, model: EmbeddingModel):
+    """
+    Make the new model active; every process picks it up within
+    ACTIVE_MODEL_TTL_SECONDS. The old column stays until dropped by hand.
+    """
+    with conn.transaction():
+        cursor.execute("UPDATE embedding_models SET status = 'retired' WHERE status = 'active';")
+        cursor.execute(
+            "UPDATE embedding_models SET status = 'active', activated_at = CURRENT_TIMESTAMP WHERE name = %s;",
+            (model.name,)
+        )
+
+
+def run_job(job_id: int):
+    """
+    Run (or resume) a job from its stored phase. Only one process runs a
+    given job at a time, guarded by a session-level advisory lock.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT pg_try_advisory_lock(%s, %s);", (REEMBED_LOCK_NAMESPACE, job_id))
+        if not cursor.fetchone()[0]:
+            logger.info("Re-embed job %s is already running in another process", job_id)
+            return
+
+        cursor.execute(
+            """
+            SELECT j.model_name, m.column_name, m.dim, j.phase, j.last_chunk_id, j.batch_size, j.max_chunks_per_second
+            FROM reembed_jobs j
+            JOIN embedding_models m ON m.name = j.model_name
+            WHERE j.id = %s AND j.status = 'running';
+            """,
+            (job_id,)
+        )
+        row = cursor.fetchone()
+        if not row:
+            return
+
+        model = EmbeddingModel(name=row[0], column=row[1], dim=row[2])
+        phase, last_chunk_id, batch_size, rate = row[3], row[4], row[5], row[6]
+        logger.info("Re-embed job %s (%s) starting at phase '%s', chunk id > %s", job_id, model.name, phase, last_chunk_id)
+
+        for current in PHASES[PHASES.index(phase):]:
+            _update_job(cursor, job_id, phase=current)
+
+            if current == "backfill":
+                _backfill(conn, cursor, job_id, model, last_chunk_id, batch_size, rate)
+            elif current == "catchup":
+                _catchup(conn, cursor, job_id, model, batch_size, rate)
+            elif current == "index":
+                cursor.execute("SELECT name, metric FROM collections;")
+                for name, metric in cursor.fetchall():
+                    create_embedding_index(cursor, name, metric, model.column, concurrently=True)
+            elif current == "flip":
+                _flip(conn, cursor, model)
+                logger.info("Re-embed job %s: '%s' is now the active model", job_id, model.name)
+            elif current == "settle":
+                # Processes with a cached old model may still ingest into the old column only.
+                # They loaded the new model while it was 'building' (preload_models), so
+                # their first request after the flip does not load it inline.
+                time.sleep(2 * ACTIVE_MODEL_TTL_SECONDS)
+                _catchup(conn, cursor, job_id, model, batch_size, rate)
+
+        _update_job(cursor, job_id, status="done")
+        logger.info("Re-embed job %s finished", job_id)
+
+    except Exception as e:
+        logger.error("Re-embed job %s failed: %s", job_id, e, extra={"event": "reembed_job_error"})
+        _update_job(cursor, job_id, status="failed", error=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def start_job_thread(job_id: int) -> threading.Thread:
+    thread = threading.Thread(target=run_job, args=(job_id,), name=f"reembed-{job_id}", daemon=True)
+    thread.start()
+    return thread
+
+
+def create_job(model_name: str, batch_size: int, max_chunks_per_second: Optional[float]) -> int:
+    """
+    Prepare the model column and create a job, or restart the unfinished
+    job of the same model from its checkpoint.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        prepare_model(cursor, model_name)
+
+        cursor.execute(
+            """
+            UPDATE reembed_jobs
+            SET status = 'running', error = NULL, batch_size = %s,
+                max_chunks_per_second = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE model_name = %s AND status IN ('running', 'failed')
+            RETURNING id;
+            """,
+            (batch_size, max_chunks_per_second, model_name)
+        )
+        row = cursor.fetchone()
+        if not row:
+            cursor.execute(
+                """
+                INSERT INTO reembed_jobs (model_name, batch_size, max_chunks_per_second)
+                VALUES (%s, %s, %s)
+                RETURNING id;
+                """,
+                (model_name, batch_size, max_chunks_per_second)
+            )
+            row = cursor.fetchone()
+        return row[0]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def resume_jobs():
+    """
+    Restart jobs interrupted by a shutdown (called on app startup).
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM reembed_jobs WHERE status = 'running' ORDER BY id;")
+    job_ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+
+    for job_id in job_ids:
+        logger.info("Resuming re-embed job %s", job_id)
+        start_job_thread(job_id)
+
+
+@router.post("", response_model=ReembedJobResponse)
+async def start_reembed(request: ReembedRequest):
+    """
+    Start re-embedding all chunks with another model in the background.
+    /search switches to the new model automatically when the job is done.
+    """
+    try:
+        # Loading the model and adding its column block, keep them off the event loop
+        job_id = await asyncio.to_thread(create_job, request.model, request.batch_size, request.max_chunks_per_second)
+        start_job_thread(job_id)
+        logger.info("Re-embed job %s started for model '%s'", job_id, request.model)
+        return await get_reembed_job(job_id)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error starting re-embed job: %s", e, extra={"event": "reembed_start_error"})
+        raise HTTPException(status_code=500, detail=f"Failed to start re-embed job: {str(e)}")
+
+
+@router.get("/{job_id}", response_model=ReembedJobResponse)
+async def get_reembed_job(job_id: int):
+    """
+    Progress of a re-embed job.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(f"SELECT {JOB_COLUMNS} FROM reembed_jobs WHERE id = %s;", (job_id,))
+        row = cursor.fetchone()
+
+        cursor.close()
+        conn.close()
+
+        if not row:
+            raise HTTPException(status_code=404, detail=f"Re-embed job {job_id} not found")
+        return _job_response(row)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching re-embed job: %s", e, extra={"event": "reembed_get_error"})
+        raise HTTPException(status_code=500, detail=f"Failed to fetch re-embed job: {str(e)}")
+
+
+@router.get("", response_model=list[ReembedJobResponse])
+async def list_reembed_jobs():
+    """
+    List all re-embed jobs, newest first.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(f"SELECT {JOB_COLUMNS} FROM reembed_jobs ORDER BY id DESC;")
+        rows = cursor.fetchall()
+
+        cursor.close()
+        conn.close()
+
+        return [_job_response(row) for row in rows]
+
+    except Exception as e:
+        logger.error("Error listing re-embed jobs: %s", e, extra={"event": "reembed_list_error"})
+        raise HTTPException(status_code=500, detail=f"Failed to list re-embed jobs: {str(e)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-embed all chunks with another model")
+    parser.add_argument("model", help="sentence-transformers model name")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--rate", type=float, default=None, help="max chunks per second")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    run_job(create_job(args.model, args.batch_size, args.rate))
@@ -0,0 +1,222 @@
+"""
+Streaming ingest for very large documents (long reports, transcripts).
+
+The body is read as a stream (text/plain, plain or chunked transfer
+encoding), chunked incrementally as bytes arrive, and chunk batches are
+embedded and written as soon as they fill. Everything happens in one
+transaction that commits at the end, so a broken upload leaves nothing
+behind. Per-request memory stays flat regardless of document size.
+
+The document's URL and content hash (its dedup keys, see app/ingest.py) are
+only written when the upload ends, so a running upload never holds a URL
+that other ingests would wait on; a duplicate is detected then and rolled
+back. Uploads are bounded by STREAM_MAX_BYTES and STREAM_READ_TIMEOUT_SECONDS
+so a slow or endless client cannot keep a transaction open indefinitely.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from psycopg.errors import UniqueViolation
+from psycopg.types.json import Jsonb
+from pydantic import BaseModel
+
+import logging
+from app.db import get_db_connection
+from app.health import require_ready
+from app.chunking import StreamingChunker
+from app.collection import DEFAULT_COLLECTION, get_collection_metric, uses_normalized_embeddings
+from app.embeddings import get_active_model, get_embeddings
+from app.ingest import (
+    CHUNK_SIZE, CHUNK_OVERLAP, add_document_url, find_existing_document, insert_document, insert_chunks
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/ingest", tags=["ingest"], dependencies=[Depends(require_ready)])
+
+# Chunks embedded and inserted per batch
+STREAM_BATCH_CHUNKS = 64
+
+# Largest accepted body, and the longest wait for the next piece of it
+STREAM_MAX_BYTES = int(os.getenv("STREAM_MAX_BYTES", str(256 * 1024 * 1024)))
+STREAM_READ_TIMEOUT_SECONDS = float(os.getenv("STREAM_READ_TIMEOUT_SECONDS", "30"))
+
+ACCEPTED_CONTENT_TYPES = ("text/plain", "application/octet-stream")
+
+
+class StreamIngestResponse(BaseModel):
+    status: str
+    document_id: int
+    chunks_inserted: int
+    bytes_received: int
+
+
+def parse_metadata(metadata: Optional[str]) -> dict[str, Any]:
+    if not metadata:
+        return {}
+    try:
+        parsed = json.loads(metadata)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"metadata must be a JSON object: {e}")
+    if not isinstance(parsed, dict):
+        raise HTTPException(status_code=400, detail="metadata must be a JSON object")
+    return parsed
+
+
+async def read_body(request: Request):
+    """
+    Yield the request body piece by piece, enforcing STREAM_MAX_BYTES and
+    STREAM_READ_TIMEOUT_SECONDS between pieces.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > STREAM_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Body larger than {STREAM_MAX_BYTES} bytes")
+
+    received = 0
+    stream = request.stream().__aiter__()
+    while True:
+        try:
+            data = await asyncio.wait_for(stream.__anext__(), STREAM_READ_TIMEOUT_SECONDS)
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=408, detail=f"No body data received for {STREAM_READ_TIMEOUT_SECONDS:g} seconds"
+            )
+        received += len(data)
+        if received > STREAM_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Body larger than {STREAM_MAX_BYTES} bytes")
+        yield data
+
+
+@router.post("/stream", response_model=StreamIngestResponse)
+async def ingest_stream(
+    request: Request,
+    title: str,
+    collection: str = DEFAULT_COLLECTION,
+    metadata: Optional[str] = None
+):
+    """
+    Ingest a document streamed as the raw request body.
+
+    - Body: UTF-8 text (Content-Type: text/plain) up to STREAM_MAX_BYTES, chunked uploads supported
+    - 408 if the client stalls for STREAM_READ_TIMEOUT_SECONDS, 413 if the body is too large
+    - title, collection and metadata (JSON object) are query parameters
+    - Chunks and embeds while the upload is still in progress, in batches of STREAM_BATCH_CHUNKS
+    - The document and all its chunks become visible together when the upload completes
+
+    Example:
+        curl -X POST "http://localhost:8000/ingest/stream?title=Raport" \\
+             -H "Content-Type: text/plain" -T raport.txt
+    """
+    content_type = request.headers.get("content-type", "text/plain").split(";")[0].strip()
+    if content_type not in ACCEPTED_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail=f"Expected text/plain body, got {content_type}")
+    document_metadata = parse_metadata(metadata)
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        metric = get_collection_metric(cursor, collection)
+        normalize = uses_normalized_embeddings(metric)
+        active = get_active_model(cursor)
+
+        # Same URL dedup as /ingest; answered before reading the body
+        if 'url' in document_metadata:
+            existing = find_existing_document(cursor, collection, url=document_metadata['url'])
+            if existing:
+                logger.info(
+                    "Document with URL '%s' already exists (ID: %s). Skipping.", document_metadata['url'], existing[0],
+                    extra={"event": "ingest_duplicate", "collection": collection, "document_id": existing[0], "sample": True}
+                )
+                return StreamIngestResponse(
+                    status="ok", document_id=existing[0], chunks_inserted=existing[1], bytes_received=0
+                )
+
+        logger.info(
+            "Streaming document: '%s' | Collection: %s", title, collection,
+            extra={"event": "ingest_stream", "collection": collection, "url": document_metadata.get("url"), "sample": True}
+        )
+
+        chunker = StreamingChunker(chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+        pending: list[str] = []
+        chunks_inserted = 0
+        bytes_received = 0
+        body_hash = hashlib.sha256()
+
+        try:
+            with conn.transaction():
+                # Without URL and hash the row cannot conflict with (or block) other ingests
+                document_id = insert_document(
+                    cursor, title, {k: v for k, v in document_metadata.items() if k != "url"}, collection
+                )
+
+                async def flush():
+                    nonlocal pending, chunks_inserted
+                    batch, pending = pending, []
+                    # Encoding and inserts run off the event loop
+                    embeddings = await asyncio.to_thread(get_embeddings, batch, normalize, active.name)
+                    chunks_inserted += await asyncio.to_thread(
+                        insert_chunks, cursor, document_id, collection, title, document_metadata,
+                        batch, embeddings, active.column, chunks_inserted
+                    )
+
+                async for data in read_body(request):
+                    bytes_received += len(data)
+                    body_hash.update(data)
+                    pending.extend(chunker.feed_bytes(data))
+                    if len(pending) >= STREAM_BATCH_CHUNKS:
+                        await flush()
+
+                pending.extend(chunker.finish())
+                if pending:
+                    await flush()
+
+                if chunks_inserted == 0:
+                    # Rolls back the document row
+                    raise HTTPException(status_code=400, detail="Document body is empty")
+
+                # Claim the dedup keys last; a conflict rolls the whole upload back
+                cursor.execute(
+                    "UPDATE documents SET metadata = %s, content_hash = %s WHERE id = %s;",
+                    (Jsonb(document_metadata), body_hash.hexdigest(), document_id)
+                )
+        except UniqueViolation:
+            existing = find_existing_document(
+                cursor, collection, url=document_metadata.get("url"), body_hash=body_hash.hexdigest()
+            )
+            if existing is None:
+                raise
+            add_document_url(cursor, collection, existing[0], document_metadata.get("url"))
+            logger.info(
+                "Streamed document duplicates ID: %s. Rolled back.", existing[0],
+                extra={"event": "ingest_duplicate", "collection": collection, "document_id": existing[0], "sample": True}
+            )
+            return StreamIngestResponse(
+                status="ok", document_id=existing[0], chunks_inserted=existing[1], bytes_received=bytes_received
+            )
+
+        cursor.close()
+
+        logger.info(
+            "Streamed document inserted with ID: %s, chunks: %s, bytes: %s", document_id, chunks_inserted, bytes_received,
+            extra={"event": "ingest_stream_done", "document_id": document_id, "chunks": chunks_inserted, "sample": True}
+        )
+        return StreamIngestResponse(
+            status="ok", document_id=document_id, chunks_inserted=chunks_inserted, bytes_received=bytes_received
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error during streaming ingestion: %s", e, extra={"event": "ingest_stream_error"})
+        raise HTTPException(status_code=500, detail=f"Failed to ingest document stream: {str(e)}")
+    finally:
+        if conn is not None:
+            conn.close()
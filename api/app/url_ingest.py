@@ -0,0 +1,416 @@
+"""
+Server-side URL ingestion.
+
+Replaces the one-page-per-webhook n8n flow (1_ingest_from_url.json) for bulk
+crawls: pages are fetched concurrently through a shared connection pool with
+per-host rate limits, title/body are extracted the same way as the workflow
+(first <h1> + all <p>), unchanged pages are skipped via ETag/Last-Modified,
+and chunks of many pages are embedded per encode() call.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from html.parser import HTMLParser
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from psycopg import Rollback
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+
+import logging
+from app.db import get_db_connection
+from app.health import require_ready
+from app.chunking import chunk_text
+from app.collection import DEFAULT_COLLECTION, get_collection_metric, uses_normalized_embeddings
+from app.embeddings import EmbeddingModel, get_active_model, get_embeddings
+from app.ingest import (
+    CHUNK_SIZE, CHUNK_OVERLAP, add_document_url, content_hash, find_documents_by_urls,
+    find_existing_document, insert_document, insert_chunks
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/ingest", tags=["ingest"], dependencies=[Depends(require_ready)])
+
+# Same User-Agent as the n8n "Fetch Page HTML" node
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+MAX_URLS_PER_REQUEST = 1000
+FETCH_TIMEOUT_SECONDS = 20.0
+
+# Larger responses are abandoned mid-download (failed: page too large)
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+
+# Chunks embedded per encode() call (across pages)
+EMBED_BATCH_SIZE = 256
+
+# Extracted pages waiting for embedding; bounds memory when fetching outpaces the CPU
+PAGE_QUEUE_SIZE = 64
+
+
+class UrlIngestRequest(BaseModel):
+    urls: list[str] = Field(..., min_length=1, max_length=MAX_URLS_PER_REQUEST)
+    collection: str = DEFAULT_COLLECTION
+    metadata: Optional[dict[str, Any]] = Field(default_factory=dict, description="Added to every document")
+    max_connections: int = Field(16, ge=1, le=100, description="Connection pool size")
+    per_host_concurrency: int = Field(2, ge=1, le=16, description="Parallel requests per host")
+    per_host_rps: float = Field(2.0, gt=0, description="Request starts per second per host")
+
+
+class UrlIngestResult(BaseModel):
+    url: str
+    status: str  # ingested | updated | unchanged | duplicate | failed
+    document_id: Optional[int] = None
+    chunks_inserted: int = 0
+    error: Optional[str] = None
+
+
+class UrlIngestResponse(BaseModel):
+    status: str
+    summary: dict[str, int]
+    results: list[UrlIngestResult]
+
+
+class PageExtractor(HTMLParser):
+    """
+    Collects the first <h1>, <title> and the text of every <p>,
+    ignoring script/style content.
+
+    </p> is optional in HTML5: an open paragraph also ends at the next
+    block-level tag, at the end of its container and at the end of input.
+    """
+
+    CAPTURE_TAGS = {"h1", "p", "title"}
+    SKIP_TAGS = {"script", "style", "noscript", "template"}
+
+    # Start (or end) of these implicitly closes an open <p>
+    P_CLOSING_TAGS = {
+        "address", "article", "aside", "blockquote", "body", "caption", "dd", "details", "div",
+        "dl", "dt", "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3",
+        "h4", "h5", "h6", "header", "hgroup", "hr", "html", "li", "main", "menu", "nav", "ol",
+        "p", "pre", "section", "table", "td", "th", "tr", "ul",
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.h1: Optional[str] = None
+        self.title: Optional[str] = None
+        self.paragraphs: list[str] = []
+        self._capture: Optional[str] = None
+        self._buffer: list[str] = []
+        self._skip_depth = 0
+
+    def _finish_capture(self):
+        text = " ".join("".join(self._buffer).split())
+        if self._capture == "p" and text:
+            self.paragraphs.append(text)
+        elif self._capture == "h1" and self.h1 is None and text:
+            self.h1 = text
+        elif self._capture == "title" and self.title is None and text:
+            self.title = text
+        self._capture = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if self._capture == "p" and tag in self.P_CLOSING_TAGS:
+            self._finish_capture()
+        if tag in self.CAPTURE_TAGS and self._capture is None:
+            self._capture = tag
+            self._buffer = []
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == self._capture or (self._capture == "p" and tag in self.P_CLOSING_TAGS):
+            self._finish_capture()
+
+    def handle_data(self, data):
+        if self._capture is not None and not self._skip_depth:
+            self._buffer.append(data)
+
+    def close(self):
+        super().close()
+        if self._capture is not None:
+            self._finish_capture()
+
+
+def extract_page(html: str) -> tuple[str, str]:
+    """
+    Extract (title, body) from HTML; paragraphs are joined with blank lines
+    like the n8n "Format Data" node.
+    """
+    parser = PageExtractor()
+    parser.feed(html)
+    parser.close()
+    title = parser.h1 or parser.title or "No Title Found"
+    return title, "\n\n".join(parser.paragraphs)
+
+
+class HostLimiter:
+    """
+    Per-host concurrency cap plus a minimum interval between request starts.
+    """
+
+    def __init__(self, concurrency: int, requests_per_second: float):
+        self.concurrency = concurrency
+        self.interval = 1.0 / requests_per_second
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._next_start: dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.concurrency))
+        async with semaphore:
+            # Reserve the next start time for this host (no await in between, so no race)
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.interval
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+async def fetch_page(
+    client: httpx.AsyncClient,
+    limiter: HostLimiter,
+    url: str,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    max_bytes: int = MAX_PAGE_BYTES
+) -> Optional[tuple[str, httpx.Headers]]:
+    """
+    GET a page within its host's limits, conditionally if validators are
+    given. Returns (html, response headers), or None on 304 Not Modified.
+    The body is streamed and the download aborted past max_bytes.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    async with limiter.slot(urlsplit(url).netloc):
+        async with client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+
+            too_large = ValueError(f"Page larger than {max_bytes} bytes")
+            if int(response.headers.get("content-length") or 0) > max_bytes:
+                raise too_large
+
+            body = bytearray()
+            async for data in response.aiter_bytes():
+                body += data
+                if len(body) > max_bytes:
+                    raise too_large
+
+            return body.decode(response.encoding or "utf-8", errors="replace"), response.headers
+
+
+def find_known_documents(collection: str, urls: list[str]) -> dict[str, tuple[int, Optional[str], Optional[str]]]:
+    """
+    Existing documents for the given URLs (matched on the normalized URL key):
+    url -> (document_id, etag, last_modified).
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    known = find_documents_by_urls(cursor, collection, urls)
+    cursor.close()
+    conn.close()
+    return known
+
+
+def store_pages(
+    pages: list[dict[str, Any]],
+    embeddings: list[list[float]],
+    collection: str,
+    active: EmbeddingModel
+) -> list[tuple[int, int, bool]]:
+    """
+    Write pages and their chunk embeddings; a changed page replaces its old
+    document in the same transaction. Returns (document_id, chunks, stored)
+    per page; stored is False when the page duplicates an existing document
+    (same normalized URL or content), which is then left untouched and gets
+    the page's URL recorded as another URL of it.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    stored = []
+    offset = 0
+
+    try:
+        for page in pages:
+            page_embeddings = embeddings[offset:offset + len(page["chunks"])]
+            offset += len(page["chunks"])
+
+            duplicate_of = None
+            with conn.transaction():
+                if page["replaces"] is not None:
+                    cursor.execute("DELETE FROM documents WHERE id = %s;", (page["replaces"],))
+                document_id = insert_document(
+                    cursor, page["title"], page["metadata"], collection, page["content_hash"]
+                )
+                if document_id is None:
+                    existing = find_existing_document(
+                        cursor, collection, page["url"], page["content_hash"]
+                    )
+                    duplicate_of = existing[0] if existing else None
+                    # Leaves the block without an error (psycopg swallows Rollback)
+                    # and also undoes the DELETE of the replaced document
+                    raise Rollback()
+                chunks_inserted = insert_chunks(
+                    cursor, document_id, collection, page["title"], page["metadata"],
+                    page["chunks"], page_embeddings, active.column
+                )
+
+            if document_id is None:
+                if duplicate_of is not None:
+                    add_document_url(cursor, collection, duplicate_of, page["url"])
+                stored.append((duplicate_of, 0, False))
+                continue
+            stored.append((document_id, chunks_inserted, True))
+    finally:
+        cursor.close()
+        conn.close()
+
+    return stored
+
+
+@router.post("/urls", response_model=UrlIngestResponse)
+async def ingest_urls(request: UrlIngestRequest):
+    """
+    Fetch, extract, chunk, embed and store many URLs concurrently.
+
+    - Fetches pages through one connection pool with per-host concurrency and rate limits
+    - Extracts title (first h1, else <title>) and body (all paragraphs); pages
+      over MAX_PAGE_BYTES are skipped as failed
+    - Re-fetches known URLs conditionally (If-None-Match / If-Modified-Since), 304 = unchanged;
+      known URLs without validators are skipped like in /ingest
+    - Embeds chunks of several pages per batch while other pages are still downloading
+    """
+    urls = list(dict.fromkeys(request.urls))
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        metric = get_collection_metric(cursor, request.collection)
+        active = get_active_model(cursor)
+        cursor.close()
+        conn.close()
+
+        known = await asyncio.to_thread(find_known_documents, request.collection, urls)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error preparing URL ingestion: %s", e, extra={"event": "ingest_urls_error"})
+        raise HTTPException(status_code=500, detail=f"Failed to ingest URLs: {str(e)}")
+
+    normalize = uses_normalized_embeddings(metric)
+    results: dict[str, UrlIngestResult] = {}
+    queue: asyncio.Queue = asyncio.Queue(maxsize=PAGE_QUEUE_SIZE)
+    limiter = HostLimiter(request.per_host_concurrency, request.per_host_rps)
+
+    logger.info("Ingesting %s URLs | Collection: %s | Known: %s", len(urls), request.collection, len(known))
+
+    async def fetch(client: httpx.AsyncClient, url: str):
+        document_id, etag, last_modified = known.get(url, (None, None, None))
+        if document_id is not None and not (etag or last_modified):
+            results[url] = UrlIngestResult(url=url, status="duplicate", document_id=document_id)
+            return
+
+        try:
+            page = await fetch_page(client, limiter, url, etag, last_modified)
+            if page is None:
+                results[url] = UrlIngestResult(url=url, status="unchanged", document_id=document_id)
+                return
+            html, response_headers = page
+
+            title, body = await asyncio.to_thread(extract_page, html)
+            chunks = chunk_text(body, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+            if not chunks:
+                results[url] = UrlIngestResult(url=url, status="failed", error="No content extracted")
+                return
+
+            metadata = {"source": "ingest_urls", **(request.metadata or {}), "url": url}
+            if response_headers.get("etag"):
+                metadata["etag"] = response_headers["etag"]
+            if response_headers.get("last-modified"):
+                metadata["last_modified"] = response_headers["last-modified"]
+
+            await queue.put({
+                "url": url,
+                "title": title,
+                "chunks": chunks,
+                "metadata": metadata,
+                "content_hash": content_hash(body),
+                "replaces": document_id,
+            })
+        except Exception as e:
+            logger.warning("Failed to fetch '%s': %s", url, e, extra={"event": "ingest_url_error", "url": url})
+            results[url] = UrlIngestResult(url=url, status="failed", error=str(e))
+
+    async def flush(pages: list[dict[str, Any]]):
+        texts = [chunk for page in pages for chunk in page["chunks"]]
+        try:
+            # CPU-bound encode and blocking DB writes off the event loop,
+            # so downloads keep going meanwhile
+            embeddings = await asyncio.to_thread(get_embeddings, texts, normalize, active.name)
+            stored = await asyncio.to_thread(store_pages, pages, embeddings, request.collection, active)
+            for page, (document_id, chunks_inserted, created) in zip(pages, stored):
+                if not created:
+                    status = "duplicate"
+                elif page["replaces"] is not None:
+                    status = "updated"
+                else:
+                    status = "ingested"
+                results[page["url"]] = UrlIngestResult(
+                    url=page["url"],
+                    status=status,
+                    document_id=document_id,
+                    chunks_inserted=chunks_inserted
+                )
+        except Exception as e:
+            logger.error("Error embedding/storing %s pages: %s", len(pages), e, extra={"event": "ingest_urls_store_error"})
+            for page in pages:
+                results[page["url"]] = UrlIngestResult(url=page["url"], status="failed", error=str(e))
+
+    async def embed_worker():
+        pages: list[dict[str, Any]] = []
+        pending_chunks = 0
+        while True:
+            page = await queue.get()
+            if page is None:
+                break
+            pages.append(page)
+            pending_chunks += len(page["chunks"])
+            # Flush on a full batch, or whenever nothing else is ready, so the CPU never idles
+            if pending_chunks >= EMBED_BATCH_SIZE or queue.empty():
+                await flush(pages)
+                pages, pending_chunks = [], 0
+        if pages:
+            await flush(pages)
+
+    limits = httpx.Limits(max_connections=request.max_connections, max_keepalive_connections=request.max_connections)
+    async with httpx.AsyncClient(
+        limits=limits,
+        timeout=FETCH_TIMEOUT_SECONDS,
+        headers={"User-Agent": USER_AGENT},
+        follow_redirects=True
+    ) as client:
+        worker = asyncio.create_task(embed_worker())
+        await asyncio.gather(*(fetch(client, url) for url in urls))
+        await queue.put(None)
+        await worker
+
+    ordered = [results[url] for url in urls]
+    summary: dict[str, int] = {}
+    for result in ordered:
+        summary[result.status] = summary.get(result.status, 0) + 1
+
+    logger.info("URL ingestion finished: %s", summary)
+    return UrlIngestResponse(status="ok", summary=summary, results=ordered)
@@ -0,0 +1,472 @@
+"""
+In-process memory-mapped vector index (optional search backend).
+
+Snapshots chunk embeddings of a collection into a flat float32/float16
+matrix file plus an id file, and runs brute-force top-k with NumPy inside
+the API process. Files are append-only and refreshed incrementally in a
+background thread, so several workers can map the same pages through the
+OS cache and searches never wait for Postgres. Postgres remains the source
+of truth for bodies and metadata.
+
+Enable with SEARCH_BACKEND=mmap.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from psycopg import sql
+
+import logging
+from app.db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "pgvector")
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "vector_index")
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+VECTOR_INDEX_REFRESH_SECONDS = float(os.getenv("VECTOR_INDEX_REFRESH_SECONDS", "30"))
+# Rewrite the files without deleted chunks once this share of rows is tombstoned
+VECTOR_INDEX_COMPACT_RATIO = float(os.getenv("VECTOR_INDEX_COMPACT_RATIO", "0.1"))
+
+# Rows fetched from Postgres per refresh round trip
+REFRESH_BATCH_SIZE = 5000
+
+# Rows scored per block; keeps float16 -> float32 upcasts small
+SCORE_BLOCK_SIZE = 65536
+
+# Transaction ids are 32-bit and wrap around; compared modulo 2^32
+XID_MODULUS = 2 ** 32
+
+# xmin of frozen rows and of bootstrap data (always visible, never new)
+FIRST_NORMAL_XID = 3
+
+
+def xid_precedes_or_equals(a: int, b: int) -> bool:
+    """
+    a <= b for 32-bit transaction ids, modulo wraparound (like Postgres).
+    """
+    return (b - a) % XID_MODULUS < XID_MODULUS // 2
+
+
+class MmapVectorIndex:
+    """
+    Append-only memory-mapped embedding matrix for one collection and one
+    embedding column (a model switch starts a fresh set of files).
+
+    Files in VECTOR_INDEX_DIR:
+        <collection>.<column>[.<generation>].vectors  raw row-major matrix (dtype, dim)
+        <collection>.<column>[.<generation>].ids      raw int64 chunk ids, same row order
+        <collection>.<column>.json     {"count", "generation", "floor", "xmin", ...}
+        <collection>.<column>.lock     flock used by the writer
+
+    A refresh reads only chunk ids above "floor" (every chunk with a lower
+    id is already in the files), which the primary key serves. Ids are not
+    committed in order (long uploads hold low ids while later inserts
+    commit), so the floor only advances to the highest id seen by an
+    earlier refresh once every transaction that was running at that time
+    has finished ("pending"). Above the floor, "xmin" - the oldest
+    transaction still running at the last snapshot - skips rows that are
+    certainly in the files already.
+
+    Compaction rewrites the files without tombstoned ids under a new
+    "generation"; other processes remap when they see it change.
+    """
+
+    def __init__(
+        self,
+        collection: str,
+        column: str,
+        dim: int,
+        directory: str = VECTOR_INDEX_DIR,
+        dtype: str = VECTOR_INDEX_DTYPE
+    ):
+        self.collection = collection
+        self.column = column
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.dim = dim
+
+        self.base_path = os.path.join(directory, f"{collection}.{column}")
+        self.meta_path = f"{self.base_path}.json"
+        self.lock_path = f"{self.base_path}.lock"
+
+        # (vectors, ids, sq_norms, generation) swapped as one tuple so searches
+        # never see arrays of different lengths while a refresh remaps
+        self._state = None
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+
+        # Sorted chunk ids found deleted in Postgres; replaced, never mutated,
+        # so search() can read it without a lock
+        self._deleted = np.empty(0, dtype=np.int64)
+        self._deleted_lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, generation: int) -> tuple[str, str]:
+        base = self.base_path if generation == 0 else f"{self.base_path}.{generation}"
+        return f"{base}.vectors", f"{base}.ids"
+
+    def _read_meta(self) -> dict:
+        meta = {
+            "count": 0, "generation": 0, "floor": 0, "floor_count": 0, "pending": None,
+            "xmin": None, "refreshed_at": 0.0, "dtype": self.dtype.name, "dim": self.dim,
+        }
+        if not os.path.exists(self.meta_path):
+            return meta
+        with open(self.meta_path) as f:
+            stored = json.load(f)
+        if stored["dtype"] != self.dtype.name or stored["dim"] != self.dim:
+            raise ValueError(
+                f"Index files for '{self.collection}' use {stored['dtype']}/{stored['dim']}, "
+                f"expected {self.dtype.name}/{self.dim}"
+            )
+        stored.pop("max_id", None)
+        meta.update(stored)
+        return meta
+
+    def _write_meta(self, meta: dict):
+        # Atomic replace so readers never see a half-written file
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _map(self, meta: dict):
+        """
+        (Re)map the first meta["count"] rows of the current generation's files.
+        """
+        count, generation = meta["count"], meta["generation"]
+        state = self._state
+        if state is not None and state[3] == generation and len(state[1]) == count:
+            return
+        if count == 0:
+            self._state = (
+                np.empty((0, self.dim), dtype=self.dtype),
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.float32),
+                generation,
+            )
+            return
+
+        vectors_path, ids_path = self._paths(generation)
+        vectors = np.memmap(vectors_path, dtype=self.dtype, mode="r", shape=(count, self.dim))
+        ids = np.memmap(ids_path, dtype=np.int64, mode="r", shape=(count,))
+
+        # Squared norms for L2/cosine; only the new tail needs computing
+        if state is not None and state[3] == generation and count > len(state[1]):
+            old = state[2]
+        else:
+            old = np.empty(0, dtype=np.float32)
+        norms = [old]
+        for start in range(len(old), count, SCORE_BLOCK_SIZE):
+            block = vectors[start:start + SCORE_BLOCK_SIZE].astype(np.float32)
+            norms.append(np.einsum("ij,ij->i", block, block))
+
+        self._state = (vectors, ids, np.concatenate(norms), generation)
+
+    @property
+    def count(self) -> int:
+        return 0 if self._state is None else len(self._state[1])
+
+    @property
+    def ready(self) -> bool:
+        """
+        True once the files have been mapped at least once.
+        """
+        return self._state is not None
+
+    def refresh(self):
+        """
+        Append chunks committed since the last refresh, compact the files
+        if enough of them are tombstoned, then remap.
+
+        Only one process writes at a time (flock). When another process
+        refreshed the files less than VECTOR_INDEX_REFRESH_SECONDS ago, this
+        one skips Postgres and just remaps.
+        """
+        with self._lock:
+            appended = 0
+            with open(self.lock_path, "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    meta = self._read_meta()
+                    if time.time() - meta["refreshed_at"] >= VECTOR_INDEX_REFRESH_SECONDS or self._state is None:
+                        appended = self._append_new_rows(meta)
+                        meta["refreshed_at"] = time.time()
+                        self._write_meta(meta)
+                    compacted = self._compact_if_needed(meta)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+            self._map(meta)
+            self.last_refresh = time.monotonic()
+
+            if compacted is not None:
+                # Only after the remap: search() reads the tombstones before
+                # the state, so it never pairs old rows with fewer tombstones
+                with self._deleted_lock:
+                    self._deleted = np.setdiff1d(self._deleted, compacted)
+
+            if appended:
+                logger.info(
+                    "Vector index '%s' refreshed: +%s rows, %s total", self.collection, appended, self.count
+                )
+
+    def _append_new_rows(self, meta: dict) -> int:
+        vectors_path, ids_path = self._paths(meta["generation"])
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        appended = 0
+
+        # Rows of transactions at or after the last low-water mark may have
+        # committed after the last snapshot; older rows are all in the files
+        if meta["xmin"] is not None:
+            xmin_filter = sql.SQL("""
+                AND xmin::text::bigint >= %s
+                AND (xmin::text::bigint - %s + %s) %% %s < %s
+            """)
+            xmin_params = (FIRST_NORMAL_XID, meta["xmin"], XID_MODULUS, XID_MODULUS, XID_MODULUS // 2)
+        else:
+            xmin_filter = sql.SQL("")
+            xmin_params = ()
+
+        # Ids above the floor are only stored past floor_count (everything
+        # before was visible to an older snapshot, so has a lower id); rows
+        # seen by an earlier refresh show up again while their transaction's
+        # xmin is not yet below the mark, so skip ids already stored
+        known = np.sort(np.fromfile(
+            ids_path,
+            dtype=np.int64,
+            count=meta["count"] - meta["floor_count"],
+            offset=meta["floor_count"] * np.dtype(np.int64).itemsize
+        )) if meta["count"] > meta["floor_count"] else None
+
+        try:
+            with open(vectors_path, "ab") as vectors_file, open(ids_path, "ab") as ids_file:
+                # Files may hold rows past meta["count"] from a crashed writer; drop them
+                vectors_file.truncate(meta["count"] * self.dim * self.dtype.itemsize)
+                ids_file.truncate(meta["count"] * np.dtype(np.int64).itemsize)
+
+                # One snapshot for the marks and every page
+                with conn.transaction():
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+                    cursor.execute(
+                        """
+                        SELECT
+                            pg_snapshot_xmin(s)::text::bigint %% %s,
+                            pg_snapshot_xmax(s)::text::bigint %% %s,
+                            (SELECT MAX(id) FROM chunks WHERE collection = %s)
+                        FROM pg_current_snapshot() s;
+                        """,
+                        (XID_MODULUS, XID_MODULUS, self.collection)
+                    )
+                    snapshot_xmin, snapshot_xmax, max_id = cursor.fetchone()
+
+                    last_id = meta["floor"]
+                    while True:
+                        # Keyset pagination over the collection's partition
+                        cursor.execute(
+                            sql.SQL("""
+                            SELECT id, {col}::real[]
+                            FROM chunks
+                            WHERE collection = %s AND id > %s AND {col} IS NOT NULL
+                            {xmin_filter}
+                            ORDER BY id
+                            LIMIT %s;
+                            """).format(col=sql.Identifier(self.column), xmin_filter=xmin_filter),
+                            (self.collection, last_id, *xmin_params, REFRESH_BATCH_SIZE)
+                        )
+                        rows = cursor.fetchall()
+                        if not rows:
+                            break
+                        last_id = rows[-1][0]
+
+                        if known is not None:
+                            positions = np.searchsorted(known, [row[0] for row in rows])
+                            rows = [
+                                row for row, pos in zip(rows, positions)
+                                if pos == len(known) or known[pos] != row[0]
+                            ]
+                            if not rows:
+                                continue
+
+                        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+                        vectors = np.asarray([row[1] for row in rows], dtype=self.dtype)
+                        vectors_file.write(vectors.tobytes())
+                        ids_file.write(ids.tobytes())
+
+                        appended += len(rows)
+                        meta["count"] += len(rows)
+
+                vectors_file.flush()
+                ids_file.flush()
+        finally:
+            cursor.close()
+            conn.close()
+
+        # Chunk ids are drawn after their transaction got its xid (the
+        # document row is always inserted first), so once every transaction
+        # running at the pending snapshot has ended, no id up to its highest
+        # one can still appear: this scan stored all of them
+        pending = meta["pending"]
+        if pending is not None and xid_precedes_or_equals(pending["xmax"], snapshot_xmin):
+            meta["floor"], meta["floor_count"] = pending["max_id"], pending["count"]
+            pending = None
+        if pending is None and max_id is not None:
+            pending = {"xmax": snapshot_xmax, "max_id": max_id, "count": meta["count"]}
+        meta["pending"] = pending
+        meta["xmin"] = snapshot_xmin
+        return appended
+
+    def _compact_if_needed(self, meta: dict):
+        """
+        Rewrite the files without tombstoned rows once they make up
+        VECTOR_INDEX_COMPACT_RATIO of the index. Called with the flock held.
+        Returns the tombstones that are gone from the files, or None.
+        """
+        deleted = self._deleted
+        if not len(deleted) or len(deleted) < VECTOR_INDEX_COMPACT_RATIO * meta["count"]:
+            return None
+
+        old_vectors_path, old_ids_path = self._paths(meta["generation"])
+        generation = meta["generation"] + 1
+        vectors_path, ids_path = self._paths(generation)
+
+        count = meta["count"]
+        ids = np.fromfile(old_ids_path, dtype=np.int64, count=count)
+        keep = ~np.isin(ids, deleted)
+        if keep.all():
+            # Another process already compacted them away
+            return deleted
+
+        vectors = np.memmap(old_vectors_path, dtype=self.dtype, mode="r", shape=(count, self.dim))
+        with open(vectors_path, "wb") as vectors_file:
+            for start in range(0, count, SCORE_BLOCK_SIZE):
+                block = vectors[start:start + SCORE_BLOCK_SIZE]
+                vectors_file.write(block[keep[start:start + SCORE_BLOCK_SIZE]].tobytes())
+        ids[keep].tofile(ids_path)
+        del vectors
+
+        # Positions shift left by the number of dropped rows before them
+        kept_before = np.concatenate([[0], np.cumsum(keep)])
+        meta["floor_count"] = int(kept_before[meta["floor_count"]])
+        if meta["pending"] is not None:
+            meta["pending"]["count"] = int(kept_before[meta["pending"]["count"]])
+        meta["count"] = int(kept_before[count])
+        meta["generation"] = generation
+        self._write_meta(meta)
+
+        # Other processes may still have the old files mapped; unlinking
+        # keeps the pages alive until they remap
+        os.remove(old_vectors_path)
+        os.remove(old_ids_path)
+
+        logger.info(
+            "Vector index '%s' compacted: -%s rows, %s total", self.collection, count - meta["count"], meta["count"]
+        )
+        return deleted
+
+    def refresh_in_background(self) -> bool:
+        """
+        Start refresh() in a daemon thread unless one is already running.
+        Returns False if a refresh was already in progress.
+        """
+        if not self._refreshing.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error("Vector index '%s' refresh failed: %s", self.collection, e)
+            finally:
+                # Also after a failure, so a broken database is not retried on every search
+                self.last_refresh = time.monotonic()
+                self._refreshing.release()
+
+        threading.Thread(target=run, name=f"vector-index-{self.collection}", daemon=True).start()
+        return True
+
+    def refresh_if_stale(self):
+        """
+        Kick off a background refresh when the mapped state is older than
+        VECTOR_INDEX_REFRESH_SECONDS (or was never built). Never blocks.
+        """
+        if self._state is None or time.monotonic() - self.last_refresh >= VECTOR_INDEX_REFRESH_SECONDS:
+            self.refresh_in_background()
+
+    def forget(self, chunk_ids):
+        """
+        Tombstone chunk ids that no longer exist in Postgres. The next
+        refresh compacts the files once enough rows are tombstoned.
+        """
+        new_ids = np.fromiter((int(chunk_id) for chunk_id in chunk_ids), dtype=np.int64)
+        with self._deleted_lock:
+            self._deleted = np.union1d(self._deleted, new_ids)
+
+    def search(self, query: list[float], metric: str, k: int) -> list[tuple[int, float]]:
+        """
+        Return up to k (chunk_id, distance) pairs, best first.
+
+        Distances match pgvector: L2 (<->), cosine distance (<=>) and
+        negative inner product (<#>).
+
+        Searches the last mapped state (CPU-bound, call it from a worker
+        thread); a stale index is refreshed in the background meanwhile.
+        """
+        self.refresh_if_stale()
+
+        # Tombstones before the state: compaction swaps the state first
+        deleted = self._deleted
+        state = self._state
+        if state is None:
+            return []
+        vectors, ids, sq_norms, _ = state
+        count = len(ids)
+        if count == 0 or k <= 0:
+            return []
+
+        q = np.asarray(query, dtype=np.float32)
+        dots = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_BLOCK_SIZE):
+            block = vectors[start:start + SCORE_BLOCK_SIZE]
+            dots[start:start + len(block)] = block.astype(np.float32, copy=False) @ q
+
+        if metric == "l2":
+            distances = np.sqrt(np.maximum(sq_norms - 2 * dots + q @ q, 0))
+        elif metric == "cosine":
+            distances = 1 - dots / np.maximum(np.sqrt(sq_norms) * np.linalg.norm(q), 1e-12)
+        elif metric == "ip":
+            distances = -dots
+        else:
+            raise ValueError(f"Unsupported metric: {metric}")
+
+        # Enough candidates that k survive even if every tombstone is among them
+        candidates = min(k + len(deleted), count)
+        top = np.argpartition(distances, candidates - 1)[:candidates]
+        top = top[np.argsort(distances[top], kind="stable")]
+        if len(deleted):
+            top = top[~np.isin(ids[top], deleted)]
+        return [(int(ids[i]), float(distances[i])) for i in top[:k]]
+
+
+_indexes: dict[tuple[str, str], MmapVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_vector_index(collection: str, column: str, dim: int) -> MmapVectorIndex:
+    """
+    Return the process-wide index for a collection and embedding column,
+    creating it on first use.
+    """
+    with _indexes_lock:
+        index = _indexes.get((collection, column))
+        if index is None:
+            index = MmapVectorIndex(collection, column, dim)
+            _indexes[(collection, column)] = index
+    return index
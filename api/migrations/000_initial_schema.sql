@@ -0,0 +1,21 @@
+-- Migration: Initial schema
+-- Description: pgvector extension and the documents table (metadata of ingested documents).
+-- Text and embeddings live in chunks (001).
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Create documents table with vector(384) for sentence-transformers
+CREATE TABLE IF NOT EXISTS documents (
+    id SERIAL PRIMARY KEY,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    metadata JSONB,
+    embedding vector(384)
+);
+
+-- GIN index on JSONB metadata for fast JSON queries
+CREATE INDEX IF NOT EXISTS documents_metadata_idx ON documents USING gin(metadata);
+
+-- Note: IVFFlat index disabled for small datasets (< 100 documents)
+-- CREATE INDEX IF NOT EXISTS documents_embedding_idx
+-- ON documents USING ivfflat (embedding vector_l2_ops) WITH (lists = 100);
@@ -0,0 +1,59 @@
+-- Migration: Add named collections with LIST-partitioned chunks
+-- Description: Every collection gets its own chunks partition and vector index
+-- with its own distance metric (l2, cosine, ip). Existing chunks move to 'default'.
+
+-- Create collections table
+CREATE TABLE IF NOT EXISTS collections (
+    name TEXT PRIMARY KEY,
+    metric TEXT NOT NULL DEFAULT 'l2' CHECK (metric IN ('l2', 'cosine', 'ip')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO collections (name, metric)
+VALUES ('default', 'l2')
+ON CONFLICT (name) DO NOTHING;
+
+-- Scope documents by collection
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS collection TEXT NOT NULL DEFAULT 'default';
+CREATE INDEX IF NOT EXISTS documents_collection_idx ON documents(collection);
+
+-- Replace the plain chunks table with a partitioned one
+ALTER TABLE chunks RENAME TO chunks_legacy;
+ALTER INDEX chunks_pkey RENAME TO chunks_legacy_pkey;
+ALTER SEQUENCE chunks_id_seq RENAME TO chunks_legacy_id_seq;
+
+CREATE TABLE chunks (
+    id SERIAL,
+    collection TEXT NOT NULL DEFAULT 'default',
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    chunk_index INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    metadata JSONB,
+    embedding vector(384),
+    PRIMARY KEY (collection, id),
+    UNIQUE(collection, document_id, chunk_index)
+) PARTITION BY LIST (collection);
+
+CREATE TABLE chunks_default PARTITION OF chunks FOR VALUES IN ('default');
+
+INSERT INTO chunks (id, collection, document_id, chunk_index, title, body, metadata, embedding)
+SELECT id, 'default', document_id, chunk_index, title, body, metadata, embedding
+FROM chunks_legacy;
+
+SELECT setval(pg_get_serial_sequence('chunks', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM chunks;
+
+-- Built after the copy, so the graph is bulk-built once instead of row by row.
+-- HNSW needs no training data, unlike IVFFlat, so it is safe on small partitions
+CREATE INDEX chunks_default_embedding_idx ON chunks_default USING hnsw (embedding vector_l2_ops);
+
+DROP TABLE chunks_legacy;
+
+-- Recreate secondary indexes on the partitioned table
+CREATE INDEX IF NOT EXISTS chunks_document_id_idx ON chunks(document_id);
+CREATE INDEX IF NOT EXISTS chunks_metadata_idx ON chunks USING gin(metadata);
+
+-- New collections are created through the API (POST /collections), e.g. for
+-- a cosine collection 'match_reports':
+-- CREATE TABLE chunks_match_reports PARTITION OF chunks FOR VALUES IN ('match_reports');
+-- CREATE INDEX chunks_match_reports_embedding_idx ON chunks_match_reports USING hnsw (embedding vector_cosine_ops);
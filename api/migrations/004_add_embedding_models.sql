@@ -0,0 +1,43 @@
+-- Migration: Add embedding model registry and re-embedding jobs
+-- Description: Each embedding model stores vectors in its own chunks column;
+-- exactly one model is 'active' and used by /ingest and /search.
+-- New models are added by the re-embedding job (app/reembed.py), which adds
+-- the column, backfills it and flips the active model.
+
+-- Create embedding_models table
+CREATE TABLE IF NOT EXISTS embedding_models (
+    name TEXT PRIMARY KEY,
+    column_name TEXT NOT NULL UNIQUE,
+    dim INTEGER NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('building', 'active', 'retired')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    activated_at TIMESTAMP
+);
+
+-- At most one active model
+CREATE UNIQUE INDEX IF NOT EXISTS embedding_models_active_idx
+ON embedding_models(status)
+WHERE status = 'active';
+
+-- The original 'embedding' column belongs to the multilingual MiniLM model
+INSERT INTO embedding_models (name, column_name, dim, status, activated_at)
+VALUES ('paraphrase-multilingual-MiniLM-L12-v2', 'embedding', 384, 'active', CURRENT_TIMESTAMP)
+ON CONFLICT (name) DO NOTHING;
+
+-- Create reembed_jobs table (checkpoint = last_chunk_id)
+CREATE TABLE IF NOT EXISTS reembed_jobs (
+    id SERIAL PRIMARY KEY,
+    model_name TEXT NOT NULL REFERENCES embedding_models(name),
+    status TEXT NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'done', 'failed')),
+    phase TEXT NOT NULL DEFAULT 'backfill',
+    last_chunk_id INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    batch_size INTEGER NOT NULL,
+    max_chunks_per_second REAL,
+    error TEXT,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Keyset scans over chunks.id across all collections
+CREATE INDEX IF NOT EXISTS chunks_id_idx ON chunks(id);
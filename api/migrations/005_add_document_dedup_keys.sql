@@ -0,0 +1,72 @@
+-- Migration: Indexed, race-free document deduplication
+-- Description: Documents get a normalized URL key (generated from metadata->>'url')
+-- and a body content hash, both unique per collection. Ingest uses
+-- INSERT ... ON CONFLICT DO NOTHING, so concurrent ingests of the same URL
+-- cannot both insert, and lookups are index scans instead of a JSONB scan.
+
+-- Normalized URL: lower-case scheme and host, no default port, no fragment,
+-- no trailing slash at the end of the path.
+--   'HTTPS://Example.com:443/News/#top' -> 'https://example.com/News'
+CREATE OR REPLACE FUNCTION normalize_url(url TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE RETURNS NULL ON NULL INPUT
+AS $$
+    SELECT CASE
+        WHEN p.parts IS NULL THEN btrim(url)
+        ELSE regexp_replace(lower(p.parts[1]), '^(http://[^/]*):80$|^(https://[^/]*):443$', '\1\2')
+             || regexp_replace(p.parts[2], '^([^?]*?)/+(\?.*)?$', '\1\2')
+    END
+    FROM (
+        SELECT regexp_match(btrim(url), '^([A-Za-z][A-Za-z0-9+.-]*://[^/?#]*)([^#]*)') AS parts
+    ) AS p;
+$$;
+
+ALTER TABLE documents
+ADD COLUMN IF NOT EXISTS url_key TEXT GENERATED ALWAYS AS (normalize_url(metadata->>'url')) STORED;
+
+-- sha256 (hex) of the ingested body; NULL for documents ingested before this migration
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- Duplicates from earlier races would block the unique index. They are not
+-- deleted automatically (that would also drop their chunks): the migration
+-- stops and lists them, with a DELETE that keeps the oldest of each group.
+DO $$
+DECLARE
+    groups_count INTEGER;
+    groups_list TEXT;
+    extra_ids TEXT;
+BEGIN
+    SELECT
+        COUNT(*),
+        string_agg(format('%s/%s: ids %s', collection, url_key, ids), '; ' ORDER BY collection, url_key)
+            FILTER (WHERE rn <= 20),
+        string_agg(extra, ', ')
+    INTO groups_count, groups_list, extra_ids
+    FROM (
+        SELECT
+            collection,
+            url_key,
+            string_agg(id::text, ', ' ORDER BY id) AS ids,
+            string_agg(id::text, ', ' ORDER BY id) FILTER (WHERE id > first_id) AS extra,
+            ROW_NUMBER() OVER (ORDER BY collection, url_key) AS rn
+        FROM (
+            SELECT id, collection, url_key, MIN(id) OVER (PARTITION BY collection, url_key) AS first_id
+            FROM documents
+            WHERE url_key IS NOT NULL
+        ) AS documents_by_key
+        GROUP BY collection, url_key
+        HAVING COUNT(*) > 1
+    ) AS duplicates;
+
+    IF groups_count > 0 THEN
+        RAISE EXCEPTION 'Migration 005: % URL(s) have more than one document (collection/url: document ids): %',
+            groups_count, groups_list
+            USING HINT = format(
+                'Remove the duplicates (this keeps the oldest document of each URL) and restart: '
+                'DELETE FROM documents WHERE id IN (%s);', extra_ids
+            );
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS documents_collection_url_key_idx ON documents(collection, url_key);
+CREATE UNIQUE INDEX IF NOT EXISTS documents_collection_content_hash_idx ON documents(collection, content_hash);
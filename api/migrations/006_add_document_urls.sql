@@ -0,0 +1,14 @@
+-- Migration: Additional URLs of documents
+-- Description: A page ingested under a new URL whose body matches an existing
+-- document (same content_hash) is not stored again; its URL is recorded here
+-- instead, so URL dedup and POST /documents/known recognise it from then on.
+
+CREATE TABLE IF NOT EXISTS document_urls (
+    collection TEXT NOT NULL,
+    url_key TEXT NOT NULL,  -- normalize_url() of the URL, like documents.url_key
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (collection, url_key)
+);
+
+CREATE INDEX IF NOT EXISTS document_urls_document_id_idx ON document_urls(document_id);
@@ -0,0 +1,151 @@
+"""
+Chunking helpers: StreamingChunker against chunk_text(), overlap merging
+and token truncation.
+"""
+import random
+import time
+
+from app.chunking import (
+    MAX_WORD_CHARS,
+    StreamingChunker,
+    chunk_text,
+    estimate_tokens,
+    merge_overlapping_chunks,
+    truncate_to_tokens,
+)
+
+WHITESPACE = [" ", "  ", "\n", "\n\n", "\t", " \r\n"]
+
+
+def random_text(rng: random.Random, words: int) -> str:
+    parts = []
+    for _ in range(words):
+        parts.append("".join(rng.choice("abcdeéż€") for _ in range(rng.randint(1, 8))))
+        parts.append(rng.choice(WHITESPACE))
+    text = "".join(parts)
+    return rng.choice(["", " ", "\n"]) + (text if rng.random() < 0.5 else text.rstrip())
+
+
+def split_randomly(rng: random.Random, data, pieces: int):
+    cuts = sorted(rng.randint(0, len(data)) for _ in range(pieces - 1))
+    return [data[start:end] for start, end in zip([0, *cuts], [*cuts, len(data)])]
+
+
+def stream(pieces, chunk_size, overlap, as_bytes=False) -> list[str]:
+    chunker = StreamingChunker(chunk_size=chunk_size, overlap=overlap)
+    chunks = []
+    for piece in pieces:
+        chunks.extend(chunker.feed_bytes(piece) if as_bytes else chunker.feed(piece))
+    chunks.extend(chunker.finish())
+    return chunks
+
+
+def expected(text, chunk_size, overlap) -> list[str]:
+    chunks = chunk_text(text, chunk_size=chunk_size, overlap=overlap)
+    # A single chunk comes back verbatim from chunk_text(), normalized from the stream
+    return [" ".join(chunks[0].split())] if len(chunks) == 1 else chunks
+
+
+def test_streaming_chunker_matches_chunk_text():
+    rng = random.Random(2024)
+    for _ in range(300):
+        chunk_size = rng.randint(1, 12)
+        overlap = rng.randint(0, chunk_size - 1)
+        text = random_text(rng, rng.randint(0, 60))
+        pieces = split_randomly(rng, text, rng.randint(1, 10))
+
+        assert stream(pieces, chunk_size, overlap) == expected(text, chunk_size, overlap), (
+            chunk_size, overlap, pieces
+        )
+
+
+def test_streaming_chunker_joins_utf8_split_across_pieces():
+    rng = random.Random(7)
+    for _ in range(100):
+        text = random_text(rng, rng.randint(1, 40))
+        data = text.encode("utf-8")
+        pieces = split_randomly(rng, data, rng.randint(2, 12))
+
+        chunks = stream(pieces, 5, 2, as_bytes=True)
+
+        assert chunks == expected(text, 5, 2)
+        assert all("�" not in chunk for chunk in chunks)
+
+
+def test_streaming_chunker_one_byte_at_a_time():
+    data = "Zażółć gęślą jaźń — 1 € za słowo".encode("utf-8")
+
+    assert stream([data[i:i + 1] for i in range(len(data))], 3, 1, as_bytes=True) == expected(
+        data.decode("utf-8"), 3, 1
+    )
+
+
+def test_streaming_chunker_replaces_invalid_utf8():
+    assert stream([b"ok \xff\xfe end"], 10, 2, as_bytes=True) == ["ok �� end"]
+
+
+def test_streaming_chunker_cuts_long_words_independent_of_pieces():
+    word = "x" * (2 * MAX_WORD_CHARS + 10)
+    text = f"start {word} end"
+    whole = stream([text], 3, 1)
+    split = stream(split_randomly(random.Random(1), text, 50), 3, 1)
+
+    assert whole == split
+    assert max(len(token) for chunk in whole for token in chunk.split()) == MAX_WORD_CHARS
+    assert "".join(" ".join(whole).split()).count("x") >= len(word)
+
+
+def test_streaming_chunker_feed_is_linear_without_whitespace():
+    chunker = StreamingChunker(chunk_size=300, overlap=50)
+    piece = "y" * 65536
+
+    started = time.perf_counter()
+    for _ in range(256):  # 16 MiB of one "word"
+        chunker.feed(piece)
+    elapsed = time.perf_counter() - started
+
+    assert len(chunker.partial) <= MAX_WORD_CHARS
+    assert elapsed < 2
+
+
+def test_merge_overlapping_chunks_undoes_chunk_text_overlap():
+    words = [f"w{i}" for i in range(23)]
+    chunks = chunk_text(" ".join(words), chunk_size=8, overlap=3)
+
+    assert merge_overlapping_chunks(chunks, max_overlap=3) == " ".join(words)
+
+
+def test_merge_overlapping_chunks_keeps_adjacent_chunks_without_overlap():
+    assert merge_overlapping_chunks(["a b", "c d"], max_overlap=2) == "a b c d"
+
+
+def test_merge_overlapping_chunks_looks_no_further_than_max_overlap():
+    assert merge_overlapping_chunks(["a b c", "a b c d"], max_overlap=2) == "a b c a b c d"
+
+
+def test_merge_overlapping_chunks_prefers_the_longest_overlap():
+    # "a" alone also matches; the two-word overlap must win
+    assert merge_overlapping_chunks(["x a a", "a a y"], max_overlap=3) == "x a a y"
+
+
+def test_merge_overlapping_chunks_skips_empty_chunks():
+    assert merge_overlapping_chunks(["", "a b", "  ", "b c"], max_overlap=2) == "a b c"
+    assert merge_overlapping_chunks([], max_overlap=2) == ""
+
+
+def test_truncate_to_tokens_returns_short_text_verbatim():
+    text = "  keep   this\nspacing "
+
+    assert truncate_to_tokens(text, 100) == text
+
+
+def test_truncate_to_tokens_fits_the_estimate():
+    text = " ".join(f"w{i}" for i in range(100))
+    for max_tokens in range(0, 40):
+        cut = truncate_to_tokens(text, max_tokens)
+        assert estimate_tokens(cut) <= max_tokens
+        assert text.startswith(cut)
+
+
+def test_truncate_to_tokens_with_budget_below_one_word():
+    assert truncate_to_tokens("one two", 1) == ""
@@ -0,0 +1,106 @@
+"""
+build_passages(): runs, duplicates, distances and the token budget.
+"""
+from app.chunking import estimate_tokens
+from app.context import build_passages
+
+
+def row(document_id, chunk_index, body, distance, is_hit, title="Doc"):
+    return (document_id, chunk_index, title, body, {"source": "test"}, distance, is_hit)
+
+
+def test_consecutive_chunks_merge_into_one_passage():
+    rows = [
+        row(1, 3, "e f g h", 0.2, False),
+        row(1, 2, "a b c d e f", 0.2, True),
+    ]
+
+    passages, total, truncated = build_passages(rows, max_overlap=2, max_tokens=100)
+
+    assert len(passages) == 1
+    assert passages[0]["body"] == "a b c d e f g h"
+    assert (passages[0]["chunk_start"], passages[0]["chunk_end"]) == (2, 3)
+    assert passages[0]["hit_chunk_indexes"] == [2]
+    assert total == estimate_tokens("a b c d e f g h")
+    assert not truncated
+
+
+def test_runs_split_on_gaps_and_documents():
+    rows = [
+        row(1, 0, "one", 0.5, True),
+        row(1, 1, "two", 0.5, False),
+        row(1, 5, "six", 0.1, True),
+        row(2, 2, "other", 0.3, True),
+    ]
+
+    passages, _, _ = build_passages(rows, max_overlap=2, max_tokens=100)
+
+    assert [(p["document_id"], p["chunk_start"], p["chunk_end"]) for p in passages] == [
+        (1, 5, 5), (2, 2, 2), (1, 0, 1)
+    ]
+    assert [p["distance"] for p in passages] == [0.1, 0.3, 0.5]
+
+
+def test_duplicate_rows_are_kept_once_and_stay_hits():
+    rows = [
+        row(1, 4, "x y", 0.4, False),
+        row(1, 4, "x y", 0.2, True),
+        row(1, 5, "z", 0.4, False),
+    ]
+
+    passages, _, _ = build_passages(rows, max_overlap=2, max_tokens=100)
+
+    assert len(passages) == 1
+    assert passages[0]["body"] == "x y z"
+    assert passages[0]["hit_chunk_indexes"] == [4]
+    assert passages[0]["distance"] == 0.2
+
+
+def test_hit_distance_wins_over_neighbour_distance():
+    rows = [
+        row(1, 0, "a", 0.1, False),  # neighbour of a better hit elsewhere
+        row(1, 1, "b", 0.6, True),
+    ]
+
+    passages, _, _ = build_passages(rows, max_overlap=2, max_tokens=100)
+
+    assert passages[0]["distance"] == 0.6
+
+
+def test_passage_of_only_neighbour_rows_uses_their_distance():
+    rows = [row(1, 7, "a", 0.3, False), row(1, 8, "b", 0.25, False)]
+
+    passages, _, _ = build_passages(rows, max_overlap=2, max_tokens=100)
+
+    assert passages[0]["hit_chunk_indexes"] == []
+    assert passages[0]["distance"] == 0.25
+
+
+def test_budget_truncates_the_last_passage_that_fits_partly():
+    rows = [
+        row(1, 0, " ".join(["best"] * 6), 0.1, True),
+        row(2, 0, " ".join(["next"] * 30), 0.2, True),
+        row(3, 0, "never", 0.3, True),
+    ]
+
+    passages, total, truncated = build_passages(rows, max_overlap=2, max_tokens=20)
+
+    assert truncated
+    assert [p["document_id"] for p in passages] == [1, 2]
+    assert passages[0]["body"] == " ".join(["best"] * 6)
+    assert passages[1]["body"].split() == ["next"] * 9
+    assert total == sum(p["tokens"] for p in passages) <= 20
+
+
+def test_budget_too_small_for_the_first_passage():
+    rows = [row(1, 0, "some words here", 0.1, True)]
+
+    passages, total, truncated = build_passages(rows, max_overlap=2, max_tokens=1)
+
+    assert passages == []
+    assert total == 0
+    assert truncated
+
+
+def test_no_rows():
+    assert build_passages([], max_overlap=2, max_tokens=10) == ([], 0, False)
@@ -0,0 +1,81 @@
+"""
+POST /ingest when a concurrent request holds the same URL or body: the
+existing document is returned, and a conflict whose document is gone
+again by the lookup is retried instead of failing.
+"""
+import asyncio
+import contextlib
+
+import pytest
+
+pytest.importorskip("psycopg")
+main = pytest.importorskip("app.main")
+from app.embeddings import EmbeddingModel  # noqa: E402
+
+
+class FakeConnection:
+    def cursor(self):
+        return self
+
+    def transaction(self):
+        return contextlib.nullcontext()
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def ingest(monkeypatch):
+    calls = {"insert": [], "find": [], "aliases": []}
+    script = {"insert": [], "find": []}
+
+    def insert_document(cursor, title, metadata, collection, body_hash=None):
+        calls["insert"].append(title)
+        return script["insert"].pop(0)
+
+    def find_existing_document(cursor, collection, url=None, body_hash=None):
+        calls["find"].append(url)
+        return script["find"].pop(0)
+
+    monkeypatch.setattr(main, "get_db_connection", FakeConnection)
+    monkeypatch.setattr(main, "get_collection_metric", lambda cursor, collection: "l2")
+    monkeypatch.setattr(main, "get_active_model", lambda cursor: EmbeddingModel("model", "embedding", 3))
+    monkeypatch.setattr(main, "get_embeddings", lambda texts, normalize, model_name: [[0.0] * 3 for _ in texts])
+    monkeypatch.setattr(main, "insert_document", insert_document)
+    monkeypatch.setattr(main, "find_existing_document", find_existing_document)
+    monkeypatch.setattr(main, "insert_chunks", lambda cursor, document_id, *args: 2)
+    monkeypatch.setattr(
+        main, "add_document_url", lambda cursor, collection, document_id, url: calls["aliases"].append(document_id)
+    )
+
+    def run(insert_results, find_results):
+        script["insert"], script["find"] = list(insert_results), list(find_results)
+        request = main.IngestRequest(title="T", body="some body text", metadata={"url": "https://example.com/a"})
+        return asyncio.run(main.ingest_document(request))
+
+    run.calls = calls
+    return run
+
+
+def test_concurrent_duplicate_returns_existing_document(ingest):
+    response = ingest(insert_results=[None], find_results=[None, (7, 4)])
+
+    assert (response.document_id, response.chunks_inserted) == (7, 4)
+    assert ingest.calls["aliases"] == [7]
+
+
+def test_conflicting_document_deleted_before_lookup_is_retried(ingest):
+    response = ingest(insert_results=[None, 12], find_results=[None, None])
+
+    assert (response.document_id, response.chunks_inserted) == (12, 2)
+    assert len(ingest.calls["insert"]) == 2
+
+
+def test_conflict_that_never_settles_is_a_409(ingest):
+    attempts = main.INSERT_ATTEMPTS
+
+    with pytest.raises(main.HTTPException) as error:
+        ingest(insert_results=[None] * attempts, find_results=[None] * (attempts + 1))
+
+    assert error.value.status_code == 409
+    assert len(ingest.calls["insert"]) == attempts
@@ -0,0 +1,270 @@
+"""
+POST /ingest/urls building blocks: fetching, extraction, conditional
+requests and per-host limits against a local HTTP server, and how
+store_pages() reports duplicates.
+"""
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+psycopg = pytest.importorskip("psycopg")
+url_ingest = pytest.importorskip("app.url_ingest")
+
+PAGE = b"""<html><head><title>Fallback</title></head><body>
+<h1>Transfer news</h1>
+<p>First paragraph.
+<p>Second paragraph, no end tag either.
+<div>Sidebar</div>
+<p>Third <b>paragraph</b>.</p>
+<script>var ignored = "<p>not text</p>";</script>
+</body></html>"""
+
+ETAG = '"v1"'
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/page":
+            if self.headers.get("If-None-Match") == ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(PAGE)))
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            self.wfile.write(PAGE)
+        elif self.path == "/large":
+            # No Content-Length: the size is only known while streaming
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            for _ in range(64):
+                self.wfile.write(b"<p>" + b"x" * 1024 + b"</p>")
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(url, **kwargs):
+    async def run():
+        limiter = url_ingest.HostLimiter(concurrency=2, requests_per_second=100)
+        async with httpx.AsyncClient() as client:
+            return await url_ingest.fetch_page(client, limiter, url, **kwargs)
+    return asyncio.run(run())
+
+
+def test_extract_page_closes_paragraphs_without_end_tags():
+    title, body = url_ingest.extract_page(PAGE.decode())
+
+    assert title == "Transfer news"
+    assert body.split("\n\n") == [
+        "First paragraph.",
+        "Second paragraph, no end tag either.",
+        "Third paragraph.",
+    ]
+
+
+def test_extract_page_keeps_paragraph_open_at_end_of_input():
+    assert url_ingest.extract_page("<p>one<p>two") == ("No Title Found", "one\n\ntwo")
+
+
+def test_fetch_page_returns_html_and_validators(server_url):
+    html, headers = fetch(f"{server_url}/page")
+
+    assert "Transfer news" in html
+    assert headers["etag"] == ETAG
+
+
+def test_fetch_page_with_matching_etag_is_not_modified(server_url):
+    assert fetch(f"{server_url}/page", etag=ETAG) is None
+
+
+def test_fetch_page_stops_past_max_bytes(server_url):
+    with pytest.raises(ValueError, match="larger than"):
+        fetch(f"{server_url}/large", max_bytes=16 * 1024)
+
+
+def test_fetch_page_raises_for_http_errors(server_url):
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch(f"{server_url}/missing")
+
+
+def test_host_limiter_spaces_request_starts_per_host():
+    limiter = url_ingest.HostLimiter(concurrency=4, requests_per_second=20)
+    starts: dict[str, list[float]] = {"a": [], "b": []}
+
+    async def request(host):
+        async with limiter.slot(host):
+            starts[host].append(time.monotonic())
+
+    async def run():
+        await asyncio.gather(*(request(host) for host in ["a", "b"] * 4))
+
+    asyncio.run(run())
+
+    for times in starts.values():
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        assert len(times) == 4
+        assert min(gaps) >= 0.045
+    # Hosts are limited independently: both start right away
+    assert abs(starts["a"][0] - starts["b"][0]) < 0.04
+
+
+class FakeDatabase:
+    """
+    documents table reduced to what store_pages() touches: unique URL and
+    content hash, DELETE, and rollback of everything since BEGIN.
+    """
+
+    def __init__(self, documents=None):
+        self.documents = dict(documents or {})  # id -> (url, content_hash)
+        self.chunks: dict[int, int] = {}
+        self.urls: dict[str, int] = {}
+        self.next_id = max(self.documents, default=0) + 1
+        self._saved = None
+
+    def find(self, url, body_hash):
+        for document_id, (doc_url, doc_hash) in sorted(self.documents.items()):
+            if doc_url == url or (body_hash is not None and doc_hash == body_hash):
+                return document_id
+        return self.urls.get(url)
+
+
+class FakeTransaction:
+    """
+    Like psycopg's Transaction: rolls back on any exception and swallows Rollback.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db._saved = (dict(self.db.documents), dict(self.db.chunks))
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.db.documents, self.db.chunks = self.db._saved
+        return exc_type is not None and issubclass(exc_type, psycopg.Rollback)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, query, params=None):
+        assert query.startswith("DELETE FROM documents WHERE id = %s")
+        self.db.documents.pop(params[0], None)
+        self.db.chunks.pop(params[0], None)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def transaction(self):
+        return FakeTransaction(self.db)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeDatabase({1: ("https://example.com/old", "hash-old")})
+
+    def insert_document(cursor, title, metadata, collection, body_hash=None):
+        if db.find(metadata["url"], body_hash) is not None:
+            return None  # ON CONFLICT DO NOTHING
+        document_id = db.next_id
+        db.next_id += 1
+        db.documents[document_id] = (metadata["url"], body_hash)
+        return document_id
+
+    def insert_chunks(cursor, document_id, collection, title, metadata, chunks, embeddings, column, start_index=0):
+        db.chunks[document_id] = len(chunks)
+        return len(chunks)
+
+    def find_existing_document(cursor, collection, url=None, body_hash=None):
+        document_id = db.find(url, body_hash)
+        return None if document_id is None else (document_id, db.chunks.get(document_id, 0))
+
+    def add_document_url(cursor, collection, document_id, url):
+        db.urls.setdefault(url, document_id)
+
+    monkeypatch.setattr(url_ingest, "get_db_connection", lambda: FakeConnection(db))
+    monkeypatch.setattr(url_ingest, "insert_document", insert_document)
+    monkeypatch.setattr(url_ingest, "insert_chunks", insert_chunks)
+    monkeypatch.setattr(url_ingest, "find_existing_document", find_existing_document)
+    monkeypatch.setattr(url_ingest, "add_document_url", add_document_url)
+    return db
+
+
+def make_page(url, body_hash, chunks=2, replaces=None):
+    return {
+        "url": url,
+        "title": url,
+        "chunks": [f"{url} chunk {i}" for i in range(chunks)],
+        "metadata": {"url": url},
+        "content_hash": body_hash,
+        "replaces": replaces,
+    }
+
+
+def store(pages):
+    embeddings = [[0.0]] * sum(len(page["chunks"]) for page in pages)
+    active = url_ingest.EmbeddingModel(name="model", column="embedding", dim=1)
+    return url_ingest.store_pages(pages, embeddings, "default", active)
+
+
+def test_store_pages_reports_duplicate_within_batch(fake_db):
+    stored = store([
+        make_page("https://example.com/a", "hash-a", chunks=2),
+        make_page("https://mirror.example.org/a", "hash-a", chunks=2),
+        make_page("https://example.com/b", "hash-b", chunks=3),
+    ])
+
+    assert stored == [(2, 2, True), (2, 0, False), (3, 3, True)]
+    assert fake_db.urls == {"https://mirror.example.org/a": 2}
+
+
+def test_store_pages_duplicate_first_in_batch(fake_db):
+    stored = store([
+        make_page("https://mirror.example.org/old", "hash-old"),
+        make_page("https://example.com/new", "hash-new", chunks=1),
+    ])
+
+    assert stored == [(1, 0, False), (2, 1, True)]
+
+
+def test_store_pages_keeps_replaced_document_when_new_content_is_a_duplicate(fake_db):
+    fake_db.documents[2] = ("https://example.com/page", "hash-page")
+
+    stored = store([make_page("https://example.com/page", "hash-old", replaces=2)])
+
+    assert stored == [(1, 0, False)]
+    assert 2 in fake_db.documents
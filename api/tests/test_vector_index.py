@@ -0,0 +1,311 @@
+"""
+MmapVectorIndex: distances against a brute-force reference, incremental
+refresh against a fake chunks partition (out-of-order commits, the id
+floor), and tombstones with compaction.
+"""
+import contextlib
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("psycopg")
+vector_index = pytest.importorskip("app.vector_index")
+
+DIM = 8
+
+
+class FakeChunks:
+    """
+    One chunks partition with MVCC reduced to what refresh() relies on:
+    rows carry the xid that inserted them and are visible once it commits.
+    """
+
+    def __init__(self):
+        self.rows = []  # (id, xid, vector)
+        self.running: set[int] = set()
+        self.next_xid = 100
+        self.next_id = 1
+        self.page_starts: list[int] = []
+
+    def begin(self) -> int:
+        xid = self.next_xid
+        self.next_xid += 1
+        self.running.add(xid)
+        return xid
+
+    def insert(self, xid: int, vector) -> int:
+        chunk_id = self.next_id
+        self.next_id += 1
+        self.rows.append((chunk_id, xid, np.asarray(vector, dtype=np.float32)))
+        return chunk_id
+
+    def commit(self, xid: int):
+        self.running.discard(xid)
+
+    def add(self, vectors) -> list[int]:
+        xid = self.begin()
+        ids = [self.insert(xid, vector) for vector in vectors]
+        self.commit(xid)
+        return ids
+
+    def delete(self, chunk_ids):
+        self.rows = [row for row in self.rows if row[0] not in set(chunk_ids)]
+
+    def visible(self):
+        return [row for row in self.rows if row[1] not in self.running]
+
+
+class FakeCursor:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.result = None
+
+    def execute(self, query, params=None):
+        if isinstance(query, str) and "SET TRANSACTION" in query:
+            return
+        if isinstance(query, str) and "pg_current_snapshot" in query:
+            xmin = min(self.chunks.running, default=self.chunks.next_xid)
+            max_id = max((row[0] for row in self.chunks.rows), default=None)
+            self.result = [(xmin, self.chunks.next_xid, max_id)]
+            return
+
+        # Keyset page: (collection, last_id, [xmin filter params], limit)
+        last_id, limit = params[1], params[-1]
+        self.chunks.page_starts.append(last_id)
+        rows = [row for row in self.chunks.visible() if row[0] > last_id]
+        if len(params) > 3:
+            first_normal, mark, modulus, _, half = params[2:7]
+            rows = [row for row in rows if row[1] >= first_normal and (row[1] - mark + modulus) % modulus < half]
+        rows.sort(key=lambda row: row[0])
+        self.result = [(row[0], row[2].tolist()) for row in rows[:limit]]
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def cursor(self):
+        return FakeCursor(self.chunks)
+
+    def transaction(self):
+        return contextlib.nullcontext()
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    chunks = FakeChunks()
+    monkeypatch.setattr(vector_index, "get_db_connection", lambda: FakeConnection(chunks))
+    monkeypatch.setattr(vector_index, "REFRESH_BATCH_SIZE", 7)
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_REFRESH_SECONDS", 0)
+    return chunks
+
+
+def make_index(tmp_path, **kwargs):
+    index = vector_index.MmapVectorIndex("default", "embedding", DIM, directory=str(tmp_path), **kwargs)
+    # Refreshes are driven by the tests, not by search()
+    index.refresh_if_stale = lambda: None
+    return index
+
+
+def stored_ids(index):
+    return sorted(int(chunk_id) for chunk_id in index._state[1])
+
+
+def brute_force(vectors, ids, query, metric):
+    vectors = np.asarray(vectors, dtype=np.float64)
+    query = np.asarray(query, dtype=np.float64)
+    if metric == "l2":
+        distances = np.linalg.norm(vectors - query, axis=1)
+    elif metric == "cosine":
+        distances = 1 - vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    else:
+        distances = -(vectors @ query)
+    order = np.argsort(distances, kind="stable")
+    return [ids[i] for i in order], distances[order]
+
+
+@pytest.mark.parametrize("metric", ["l2", "cosine", "ip"])
+def test_search_matches_brute_force(tmp_path, chunks, metric):
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(50, DIM)).astype(np.float32)
+    ids = chunks.add(vectors)
+    index = make_index(tmp_path)
+    index.refresh()
+    query = rng.normal(size=DIM)
+
+    result = index.search(query.tolist(), metric, 10)
+
+    expected_ids, expected_distances = brute_force(vectors, ids, query, metric)
+    assert [chunk_id for chunk_id, _ in result] == expected_ids[:10]
+    np.testing.assert_allclose([d for _, d in result], expected_distances[:10], rtol=1e-4, atol=1e-5)
+
+
+def test_search_in_float16_stays_close_to_brute_force(tmp_path, chunks):
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(40, DIM)).astype(np.float32)
+    ids = chunks.add(vectors)
+    index = make_index(tmp_path, dtype="float16")
+    index.refresh()
+
+    result = index.search(vectors[5].tolist(), "l2", 1)
+
+    assert result[0][0] == ids[5]
+    assert result[0][1] == pytest.approx(0, abs=1e-2)
+
+
+def test_search_returns_at_most_count_rows(tmp_path, chunks):
+    chunks.add(np.eye(DIM)[:3])
+    index = make_index(tmp_path)
+    index.refresh()
+
+    assert len(index.search([1.0] * DIM, "l2", 10)) == 3
+    assert index.search([1.0] * DIM, "l2", 0) == []
+
+
+def test_refresh_picks_up_rows_committed_out_of_id_order(tmp_path, chunks):
+    index = make_index(tmp_path)
+    slow = chunks.begin()
+    slow_id = chunks.insert(slow, np.ones(DIM))
+    fast_ids = chunks.add(np.eye(DIM)[:2])
+    index.refresh()
+    assert stored_ids(index) == fast_ids
+
+    chunks.commit(slow)
+    index.refresh()
+    index.refresh()
+
+    assert stored_ids(index) == sorted([slow_id, *fast_ids])
+    assert index.count == 3
+
+
+def test_refresh_scans_only_above_the_floor(tmp_path, chunks):
+    index = make_index(tmp_path)
+    first = chunks.add(np.eye(DIM))
+    index.refresh()
+    second = chunks.add(np.eye(DIM))
+    index.refresh()
+    chunks.add(np.eye(DIM))
+
+    chunks.page_starts.clear()
+    index.refresh()
+
+    # The floor has moved past the first batch; nothing below it is re-read
+    assert chunks.page_starts[0] >= max(first)
+    assert index.count == 3 * DIM
+    assert len(set(stored_ids(index))) == 3 * DIM
+    assert max(second) in stored_ids(index)
+
+
+def test_floor_waits_for_transactions_running_at_the_pending_snapshot(tmp_path, chunks):
+    index = make_index(tmp_path)
+    slow = chunks.begin()
+    slow_id = chunks.insert(slow, np.ones(DIM))
+    chunks.add(np.eye(DIM))
+    for _ in range(3):
+        index.refresh()
+        chunks.add(np.eye(DIM)[:1])
+
+    # Still running: the floor must not pass its id
+    meta = index._read_meta()
+    assert meta["floor"] < slow_id
+
+    chunks.commit(slow)
+    index.refresh()
+    assert slow_id in stored_ids(index)
+
+
+def test_other_process_remaps_without_querying(tmp_path, chunks, monkeypatch):
+    chunks.add(np.eye(DIM))
+    writer = make_index(tmp_path)
+    writer.refresh()
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_REFRESH_SECONDS", 3600)
+    reader = make_index(tmp_path)
+    reader._state = (np.empty((0, DIM), dtype=np.float32), np.empty(0, dtype=np.int64), np.empty(0), 0)
+
+    chunks.page_starts.clear()
+    reader.refresh()
+
+    assert chunks.page_starts == []
+    assert reader.count == DIM
+
+
+def test_forgotten_chunks_are_skipped_but_k_rows_returned(tmp_path, chunks):
+    ids = chunks.add(np.eye(DIM))
+    index = make_index(tmp_path)
+    index.refresh()
+    query = np.eye(DIM)[0].tolist()
+    assert index.search(query, "l2", 1)[0][0] == ids[0]
+
+    index.forget({ids[0], ids[1]})
+
+    result = index.search(query, "l2", 3)
+    assert len(result) == 3
+    assert {ids[0], ids[1]}.isdisjoint(chunk_id for chunk_id, _ in result)
+
+
+def test_compaction_rewrites_files_without_tombstones(tmp_path, chunks, monkeypatch):
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_COMPACT_RATIO", 0.25)
+    ids = chunks.add(np.eye(DIM))
+    index = make_index(tmp_path)
+    index.refresh()
+    other = make_index(tmp_path)
+    other.refresh()
+
+    index.forget(ids[:1])
+    index.refresh()
+    assert index.count == DIM  # below the ratio: kept
+
+    chunks.delete(ids[:2])
+    index.forget(ids[:2])
+    index.refresh()
+
+    assert stored_ids(index) == ids[2:]
+    assert len(index._deleted) == 0
+    assert index._read_meta()["generation"] == 1
+    assert not (tmp_path / "default.embedding.vectors").exists()
+
+    # Another process picks up the new generation and keeps finding new rows
+    new_ids = chunks.add(np.eye(DIM)[:2])
+    other.refresh()
+    assert stored_ids(other) == ids[2:] + new_ids
+    result = other.search(np.eye(DIM)[0].tolist(), "l2", 1)
+    assert result[0][0] == new_ids[0]
+
+
+def test_forget_during_search_is_safe(tmp_path, chunks):
+    ids = chunks.add(np.random.default_rng(1).normal(size=(200, DIM)))
+    index = make_index(tmp_path)
+    index.refresh()
+    errors = []
+
+    def forget_all():
+        for chunk_id in ids[:150]:
+            index.forget([chunk_id])
+
+    def search_many():
+        try:
+            for _ in range(200):
+                assert len(index.search([1.0] * DIM, "l2", 5)) == 5
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=forget_all), threading.Thread(target=search_many)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []